@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark of turning .torrent files into magnets with the bencode scanner against torf, which decodes and validates
+the whole file. Every case is checked to give the same magnet with both.
+
+usage: benchmarks/bench_bencode.py [--pieces 64,4096,65536] [--files 1000] [--repeat 20] [--json out]
+"""
+import argparse
+import hashlib
+import io
+
+import harness
+from fake_jackett import bencode as encode
+
+harness.configure()
+
+import bencode  # noqa: E402
+from torf import Torrent  # noqa: E402
+
+PIECE_LENGTH = 256 * 1024
+TRACKERS = [["udp://tracker.example:1337/announce"], ["http://tracker.example/announce", "udp://backup.example:80"]]
+
+
+def torrent_file(pieces, files=0):
+    """A torrent of ``pieces`` pieces, a single file or spread over ``files`` files"""
+    info = {
+        "name": f"Some.Show.S01.COMPLETE.1080p.WEB.h264-GRP [{pieces}]",
+        "piece length": PIECE_LENGTH,
+        "pieces": b"".join(hashlib.sha1(b"%d" % i).digest() for i in range(pieces)),
+    }
+    size = PIECE_LENGTH * pieces
+    if files:
+        lengths = [size // files] * (files - 1)
+        lengths.append(size - sum(lengths))
+        info["files"] = [{"length": length, "path": ["Season 1", f"file {i}.mkv"]} for i, length in enumerate(lengths)]
+    else:
+        info["length"] = size
+
+    return encode({"announce": TRACKERS[0][0], "announce-list": TRACKERS, "created by": "bench", "info": info})
+
+
+def with_torf(content):
+    return str(Torrent.read_stream(io.BytesIO(content)).magnet())
+
+
+def chunked(content, size=64 * 1024):
+    return (content[i:i + size] for i in range(0, len(content), size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pieces", default="64,4096,65536", help="comma separated piece counts")
+    parser.add_argument("--files", type=int, default=1000, help="files of the multi file torrents, 0 to skip them")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    cases = []
+    for pieces in [int(p) for p in args.pieces.split(",")]:
+        cases.append((f"{pieces} pieces", torrent_file(pieces)))
+        if args.files:
+            cases.append((f"{pieces} pieces {args.files} files", torrent_file(pieces, args.files)))
+
+    results = []
+    for label, content in cases:
+        expected = with_torf(content)
+        if bencode.magnet_from_torrent(content) != expected:
+            raise SystemExit(f"{label}: magnets differ\n  torf:    {expected}\n  scanner: "
+                             f"{bencode.magnet_from_torrent(content)}")
+
+        extra = {"torrent_kb": len(content) // 1024}
+        results.append(harness.measure("torf", label, lambda: with_torf(content), repeat=args.repeat, extra=extra))
+        results.append(harness.measure("scanner", label, lambda: bencode.magnet_from_torrent(content),
+                                       repeat=args.repeat, extra=extra))
+        results.append(harness.measure("scanner 64k", label, lambda: bencode.magnet_from_chunks(chunked(content)),
+                                       repeat=args.repeat, extra=extra))
+
+    harness.report(results, args.json)
+
+
+if __name__ == "__main__":
+    main()
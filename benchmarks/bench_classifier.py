@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of the release name classifier against the per-category regex search it replaced.
+
+usage: benchmarks/bench_classifier.py [repeat]
+"""
+import itertools
+import random
+import re
+import sys
+import timeit
+from os import path
+
+sys.path.insert(0, path.join(path.dirname(path.abspath(__file__)), '..', 'src'))
+
+import classifier  # noqa: E402
+
+SAMPLE_NAMES = [
+    "The.Matrix.1999.2160p.UHD.BluRay.x265.10bit.HDR.TrueHD.7.1.Atmos-TERMiNAL",
+    "The Matrix (1999) 1080p BrRip x264 - 1.85GB - YIFY",
+    "The.Matrix.1999.720p.BluRay.DD5.1.x264-CtrlHD",
+    "The Matrix 1999 DVDRip XviD-NoGrp",
+    "Dune.Part.Two.2024.HDCAM.c1nem4.x264-SUNSCREEN[TGx]",
+    "Dune Part Two 2024 1080p HDTS x264-NOGRP",
+    "Dune.Part.Two.2024.WEB-DL.1080p.DDP5.1.Atmos.H.264-FLUX",
+    "Oppenheimer.2023.1080p.WEBRip.x264.AAC5.1-[YTS.MX]",
+    "Oppenheimer 2023 DVDScr XviD AC3-EVO",
+    "Oppenheimer (2023) 3D HSBS 1080p BluRay x264",
+    "Severance.S02E03.Who.Is.Alive.2160p.ATVP.WEB-DL.DDP5.1.DV.H.265-NTb",
+    "Severance S02E03 720p HDTV x264-SYNCOPY",
+    "Severance.S01.COMPLETE.1080p.ATVP.WEBRip.x264-GalaxyTV",
+    "The Office US S05E14 480p WEB-DL x264-mSD",
+    "The.Office.US.S05.DVDRip.XviD-REWARD",
+    "Friends.S03E01.VHSRip.XviD",
+    "Blade.Runner.1982.Final.Cut.BDRemux.1080p",
+    "Blade Runner 1982 Workprint Cut 480p",
+    "Top.Gun.Maverick.2022.TELESYNC.x264-NoGrp",
+    "Top Gun Maverick 2022 Trailer 4K",
+    "Top.Gun.Maverick.2022.LINE.Audio.TS.x264",
+    "Planet.Earth.II.2016.2160p.UHD.BluRay.REMUX.HDR.HEVC",
+    "Planet Earth II (2016) 1440p IPTVRip",
+    "Chernobyl.S01E05.SATRip.x264",
+    "Chernobyl 2019 Miniseries Complete",
+    "Das.Boot.1981.Directors.Cut.German.DVD9",
+    "Amelie.2001.FRENCH.1080p.BluRay.DTS.x264-UTT",
+    "Spirited Away (2001) [1920x1080] [Dual Audio]",
+    "Parasite.2019.KOREAN.HDRip.XviD.AC3-EVO",
+    "Arrival 2016 720p hd-rip x264",
+]
+
+TITLES = ["The.Matrix", "Dune.Part.Two", "Severance.S02E03", "The Office S05", "Planet.Earth.II", "Parasite"]
+YEARS = ["1999", "2016", "2024", ""]
+RESOLUTIONS = ["2160p", "1080p", "720p", "480p", "1440p", "4K", "UHD", "FHD", ""]
+SOURCES = ["BluRay", "WEB-DL", "WEBRip", "HDTV", "DVDRip", "BDRemux", "HDCAM", "TS", "DVDScr", "IPTVRip", ""]
+CODECS = ["x264", "x265", "HEVC", "XviD", "H.264", ""]
+GROUPS = ["-FLUX", "-NTb", "-YTS", "-EVO", "[TGx]", ""]
+
+
+def build_corpus(size=5000, seed=1):
+    rng = random.Random(seed)
+    generated = [
+        ".".join(p for p in parts if p)
+        for parts in itertools.product(TITLES, YEARS, RESOLUTIONS, SOURCES, CODECS)
+    ]
+    rng.shuffle(generated)
+    corpus = SAMPLE_NAMES + [name + rng.choice(GROUPS) for name in generated]
+    return corpus[:size]
+
+
+def legacy_classify(name, table, default=classifier.UNKNOWN):
+    for result, search_keys in list(table.items()):
+        if bool(re.search(r'\W+(' + "|".join(search_keys) + r')\W*', name, re.IGNORECASE)):
+            return result
+
+    return default
+
+
+def legacy(corpus):
+    ranks = list(classifier.resolutions.keys())[::-1]
+    for name in corpus:
+        resolution = legacy_classify(name, classifier.resolutions)
+        ranks.index(resolution)
+        legacy_classify(name, classifier.release_types)
+
+
+def compiled(corpus):
+    ranks = classifier.resolution_classifier.ranks
+    for name in corpus:
+        ranks[classifier.resolution_classifier.classify(name)]
+        classifier.release_type_classifier.classify(name)
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    corpus = build_corpus()
+
+    mismatches = [
+        name for name in corpus
+        if legacy_classify(name, classifier.resolutions) != classifier.resolution_classifier.classify(name)
+        or legacy_classify(name, classifier.release_types) != classifier.release_type_classifier.classify(name)
+    ]
+    if mismatches:
+        print(f"{len(mismatches)} names classified differently, e.g. {mismatches[:5]}")
+        sys.exit(1)
+
+    print(f"corpus: {len(corpus)} release names, best of {repeat}")
+    for name, func in [("legacy", legacy), ("compiled", compiled)]:
+        best = min(timeit.repeat(lambda: func(corpus), number=1, repeat=repeat))
+        print(f"{name:>10}: {best * 1000:8.2f} ms total, {best / len(corpus) * 1e6:6.2f} us/name")
+
+
+if __name__ == '__main__':
+    main()
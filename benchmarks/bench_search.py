@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of a search against a local fake Jackett, no network or Kodi needed.
+
+Measures parsing feeds of several sizes, the torznab search, resolving links with ``torrent.get_magnet`` and the whole
+``search_jackett`` pipeline, and reports throughput, latency percentiles and peak memory for each.
+
+usage: benchmarks/bench_search.py [--sizes 100,1000,5000,20000] [--latency 0.05] [--failure-rate 0.05] [--json out]
+"""
+import argparse
+import time
+
+import harness
+from fake_jackett import FakeJackett
+
+harness.configure()
+
+import jackett  # noqa: E402
+import torrent  # noqa: E402
+import utils  # noqa: E402
+from client import Jackett  # noqa: E402
+from kodi_six import xbmcgui  # noqa: E402
+from stats import Stats  # noqa: E402
+
+
+def bench_parse(fake, client, sizes, repeat):
+    results = []
+    for size in sizes:
+        fake.items = size
+        feed = fake.feed()
+        results.append(harness.measure("parse", f"{size} items", lambda: client._parse_items(feed), units=size,
+                                       repeat=repeat, extra={"feed_kb": len(feed) // 1024}))
+    return results
+
+
+def bench_search(fake, client, sizes, repeat):
+    results = []
+    for size in sizes:
+        fake.items = size
+        fake.feed()
+        results.append(harness.measure("search", f"{size} items", lambda: client.search_query("some movie"),
+                                       units=size, repeat=repeat))
+    return results
+
+
+def bench_get_magnet(fake, count):
+    """Resolves ``count`` links of every kind on the resolver pool, the latency is the one of every single resolve"""
+    results = []
+    kinds = {"redirect": "dl/{}", "torrent": "torrent/{}.torrent", "fail": "fail/{}"}
+    for kind, path in kinds.items():
+        uris = [f"{fake.url}/{path.format(n)}" for n in range(count)]
+        latencies = []
+
+        def timed(uri):
+            start = time.perf_counter()
+            torrent.get_magnet(uri)
+            latencies.append(time.perf_counter() - start)
+
+        def resolve_all():
+            list(torrent.resolver().map(timed, uris))
+
+        results.append(harness.measure("get_magnet", kind, resolve_all, units=count, repeat=1, warmup=0,
+                                       timings=latencies))
+    return results
+
+
+def bench_search_jackett(fake, sizes, repeat, max_results):
+    results = []
+    payload = {"title": "Some Movie", "search_title": "Some Movie", "year": 2019, "imdb_id": "tt0000001",
+               "titles": {"source": "Some Movie"}}
+    for size in sizes:
+        fake.items = size
+        fake.feed()
+        stats = []
+
+        def run():
+            stats.append(Stats("movie"))
+            jackett.search_jackett(xbmcgui.DialogProgressBG(), payload, "movie", utils.Deadline(0), stats[-1])
+
+        result = harness.measure("search_jackett", f"{size} items", run, units=1, repeat=repeat,
+                                 extra={"max_results": max_results})
+        # the stage breakdown of the last timed run, the memory run comes after it
+        result.extra["stages_ms"] = stats[-2].record()["stages_ms"]
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,5000,20000",
+                        help="comma separated feed sizes (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case (default: %(default)s)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API call")
+    parser.add_argument("--download-latency", type=float, default=0.0, help="seconds added to every link")
+    parser.add_argument("--failure-rate", type=float, default=0.05, help="share of links that fail")
+    parser.add_argument("--resolves", type=int, default=200, help="links resolved per kind (default: %(default)s)")
+    parser.add_argument("--max-results", type=int, default=50)
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads", help="HTTP engine to use")
+    parser.add_argument("--stages", default="parse,search,get_magnet,search_jackett",
+                        help="comma separated stages to run (default: %(default)s)")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the addon's log")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    stages = args.stages.split(",")
+
+    with FakeJackett(latency=args.latency, download_latency=args.download_latency,
+                     failure_rate=args.failure_rate) as fake:
+        harness.configure(verbose=args.verbose, host=fake.url, max_results=args.max_results,
+                          http_engine=1 if args.engine == "asyncio" else 0,
+                          filter_include_resolution_enabled=False, filter_include_release=False)
+        client = Jackett(fake.url, harness.SETTINGS["api_key"], p_dialog=xbmcgui.DialogProgressBG())
+
+        results = []
+        if "parse" in stages:
+            results += bench_parse(fake, client, sizes, args.repeat)
+        if "search" in stages:
+            results += bench_search(fake, client, sizes, args.repeat)
+        if "get_magnet" in stages:
+            results += bench_get_magnet(fake, args.resolves)
+        if "search_jackett" in stages:
+            results += bench_search_jackett(fake, sizes, args.repeat, args.max_results)
+
+        print(f"engine: {args.engine}, latency: {args.latency}s, download latency: {args.download_latency}s, "
+              f"failure rate: {args.failure_rate:.0%}, {fake.requests} requests served\n")
+
+    harness.report(results, args.json)
+    for result in results:
+        if "stages_ms" in result.extra:
+            stages_ms = ", ".join(f"{name} {ms:.1f}" for name, ms in result.extra["stages_ms"].items())
+            print(f"{result.stage} {result.label}: {stages_ms}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Startup cost of the addon's entry points, from ``python -X importtime`` in a fresh interpreter for each, the way Kodi
+runs them. Only what's imported after the Kodi and Elementum stubs is counted.
+
+Every entry point has a budget and a list of modules it must not load, the check fails (exit status 1) when one is
+over its budget or loads one of them. The module lists catch regressions on any box, the budgets are for this one:
+use ``--scale`` on slower ones.
+
+usage: benchmarks/bench_startup.py [--repeat 5] [--scale 1.0] [--top 5] [--json out]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from os import path
+
+BENCHMARKS = path.dirname(path.abspath(__file__))
+SRC = path.join(BENCHMARKS, "..", "src")
+STUBS = path.join(BENCHMARKS, "stubs")
+
+_MARKER = "-- entry point --"
+_PRELUDE = f"""
+import sys
+import kodi_six, elementum.provider
+sys.stderr.write({_MARKER!r} + "\\n")
+"""
+_RUN_MAIN = """
+import runpy
+sys.argv = ["main.py", "{}"]
+runpy.run_path(%r, run_name="__main__")
+""" % path.join(SRC, "main.py")
+
+# name: (code, budget in ms, modules it must not import)
+ENTRY_POINTS = {
+    # what Elementum's call costs before the search starts
+    "main": (_RUN_MAIN, 60, ("requests", "torf", "asyncio")),
+    # what a search loads by the time it makes its first request, validate_settings loads the same
+    "search": ("import jackett, client", 250, ("torf", "asyncio")),
+    "search asyncio": ("import jackett, async_client", 300, ("torf",)),
+    "service": ("import service", 60, ("requests", "torf", "asyncio")),
+}
+
+
+def import_times(code):
+    """``(name, self_us, cumulative_us, depth)`` of every module imported by ``code`` after the stubs"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([SRC, STUBS]))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _PRELUDE + code], env=env,
+                          stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, universal_newlines=True, check=False)
+    lines = proc.stderr.splitlines()
+    if _MARKER not in lines:
+        raise SystemExit(f"entry point failed:\n{proc.stderr}")
+
+    times = []
+    for line in lines[lines.index(_MARKER) + 1:]:
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        times.append((name.strip(), int(self_us), int(cumulative_us), len(name) - len(name.lstrip())))
+    return times
+
+
+def measure(name, code, budget_ms, forbidden, repeat, top):
+    import_times(code)  # compiles what isn't yet
+    runs = [import_times(code) for _ in range(repeat)]
+    totals = [sum(cumulative for _, _, cumulative, depth in times if depth == min(t[3] for t in times)) / 1000
+              for times in runs]
+
+    modules = {module for module, _, _, _ in runs[0]}
+    loaded = sorted(m for m in forbidden if m in modules)
+    heaviest = sorted(runs[0], key=lambda t: t[1], reverse=True)[:top]
+    total = statistics.median(totals)
+    return {
+        "entry_point": name,
+        "median_ms": round(total, 1),
+        "budget_ms": budget_ms,
+        "modules": len(modules),
+        "forbidden_loaded": loaded,
+        "heaviest": [(module, round(self_us / 1000, 1)) for module, self_us, _, _ in heaviest],
+        "ok": total <= budget_ms and not loaded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per entry point, the median is reported")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the budgets, for slower machines")
+    parser.add_argument("--top", type=int, default=5, help="heaviest modules to list per entry point")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = [measure(name, code, round(budget * args.scale), forbidden, args.repeat, args.top)
+               for name, (code, budget, forbidden) in ENTRY_POINTS.items()]
+
+    header = f"{'entry point':<16} {'median ms':>10} {'budget ms':>10} {'modules':>8}  heaviest (self ms)"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        heaviest = ", ".join(f"{module} {ms}" for module, ms in result["heaviest"])
+        print(f"{result['entry_point']:<16} {result['median_ms']:>10.1f} {result['budget_ms']:>10} "
+              f"{result['modules']:>8}  {heaviest}")
+        if result["forbidden_loaded"]:
+            print(f"{'':<16} loads {', '.join(result['forbidden_loaded'])}, which it shouldn't")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nwrote {args.json}")
+
+    failed = [result["entry_point"] for result in results if not result["ok"]]
+    if failed:
+        print(f"\nover budget: {', '.join(failed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
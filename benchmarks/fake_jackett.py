@@ -0,0 +1,222 @@
+"""
+A local stand-in for Jackett that serves caps, torznab feeds of any size and the links found in them.
+
+Every item in a feed links to one of:
+
+- a magnet, right in the ``magneturl`` attribute
+- ``/dl/<n>``, which redirects to a magnet the way Jackett's download proxy does
+- ``/torrent/<n>.torrent``, which serves a real .torrent file
+- ``/fail/<n>``, which answers 500
+
+Latency can be injected on searches and on downloads, and a share of the links can be made to fail.
+"""
+import hashlib
+import http.server
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+
+CAPS = b'<?xml version="1.0" encoding="UTF-8"?><caps><server title="Jackett"/><searching>' \
+       b'<search available="yes" supportedParams="q"/>' \
+       b'<tv-search available="yes" supportedParams="q,season,ep,imdbid"/>' \
+       b'<movie-search available="yes" supportedParams="q,imdbid"/>' \
+       b'</searching></caps>'
+
+NAMES = [
+    "Some.Movie.2019.2160p.UHD.BluRay.x265.10bit.HDR-GRP",
+    "Some.Movie.2019.1080p.BluRay.x264-GRP",
+    "Some.Movie.2019.720p.WEB-DL.DD5.1.H.264-GRP",
+    "Some Movie 2019 DVDRip XviD-GRP",
+    "Some.Movie.2019.HDCAM.x264",
+    "Some.Show.S01E02.1080p.WEB.h264-GRP",
+    "Some Show S01E02 720p HDTV x264-GRP",
+    "Some.Show.S01.COMPLETE.480p.WEBRip",
+]
+
+
+def bencode(value):
+    if isinstance(value, int):
+        return b"i%de" % value
+    if isinstance(value, str):
+        value = value.encode("utf-8")
+    if isinstance(value, bytes):
+        return b"%d:%s" % (len(value), value)
+    if isinstance(value, list):
+        return b"l" + b"".join(bencode(v) for v in value) + b"e"
+    if isinstance(value, dict):
+        return b"d" + b"".join(bencode(k) + bencode(value[k]) for k in sorted(value)) + b"e"
+    raise TypeError(f"can't bencode {type(value)}")
+
+
+def torrent_file(n, pieces=64):
+    piece_length = 256 * 1024
+    info = {
+        "name": f"{NAMES[n % len(NAMES)]}.{n}.mkv",
+        "piece length": piece_length,
+        "length": piece_length * pieces,
+        "pieces": b"".join(hashlib.sha1(b"%d-%d" % (n, i)).digest() for i in range(pieces)),
+    }
+    return bencode({"announce": "udp://tracker.example:1337/announce", "info": info})
+
+
+def info_hash(n):
+    return hashlib.sha1(b"item-%d" % n).hexdigest()
+
+
+class FakeJackett(object):
+    """
+    Serves on a free local port from a daemon thread. ``items`` is the number of items in every feed, ``latency`` is
+    added to every API call and ``download_latency`` to every link. ``failure_rate`` is the share of links that fail,
+    ``magnet_share`` / ``torrent_share`` the share that are direct magnets / .torrent files, the rest redirect.
+    """
+
+    def __init__(self, items=100, latency=0.0, download_latency=0.0, failure_rate=0.0, magnet_share=0.3,
+                 torrent_share=0.2, indexers=4):
+        self.items = items
+        self.latency = latency
+        self.download_latency = download_latency
+        self.failure_rate = failure_rate
+        self.magnet_share = magnet_share
+        self.torrent_share = torrent_share
+        self.indexers = indexers
+        self.requests = 0
+        self._feeds = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self):
+        fake = self
+
+        class Handler(_Handler):
+            jackett = fake
+
+        self._server = _Server(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, name="fake-jackett", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def link_kind(self, n):
+        # spread the kinds evenly over the feed, with the same kind for the same item every time
+        slot = (n * 37 % 100) / 100
+        if slot < self.magnet_share:
+            return "magnet"
+        slot -= self.magnet_share
+        if slot < self.failure_rate:
+            return "fail"
+        slot -= self.failure_rate
+        if slot < self.torrent_share:
+            return "torrent"
+        return "redirect"
+
+    def feed(self, indexer="all"):
+        key = (indexer, self.items, self.failure_rate, self.magnet_share, self.torrent_share)
+        with self._lock:
+            if key not in self._feeds:
+                self._feeds[key] = self._build_feed(indexer)
+            return self._feeds[key]
+
+    def _build_feed(self, indexer):
+        items = []
+        for n in range(self.items):
+            indexer_id = f"idx{n % self.indexers}"
+            if indexer != "all" and indexer != indexer_id:
+                continue
+
+            kind = self.link_kind(n)
+            attrs = f'<torznab:attr name="seeders" value="{n * 7 % 500}"/>' \
+                    f'<torznab:attr name="peers" value="{n * 3 % 90}"/>'
+            if kind == "magnet":
+                link = f"magnet:?xt=urn:btih:{info_hash(n)}&amp;dn=item{n}"
+                attrs += f'<torznab:attr name="magneturl" value="{link}"/>' \
+                         f'<torznab:attr name="infohash" value="{info_hash(n)}"/>'
+            elif kind == "torrent":
+                link = f"{self.url}/torrent/{n}.torrent"
+            elif kind == "fail":
+                link = f"{self.url}/fail/{n}"
+            else:
+                link = f"{self.url}/dl/{n}"
+
+            items.append(
+                f"<item><title>{NAMES[n % len(NAMES)]}.{n}</title><guid>{self.url}/guid/{n}</guid>"
+                f'<jackettindexer id="{indexer_id}">Indexer {n % self.indexers}</jackettindexer>'
+                f"<link>{link}</link><size>{(n % 200 + 1) * 50 * 1024 * 1024}</size>{attrs}</item>")
+
+        return ('<?xml version="1.0" encoding="UTF-8"?>'
+                '<rss version="2.0" xmlns:torznab="http://torznab.com/schemas/2015/feed"><channel>'
+                + "".join(items) + "</channel></rss>").encode("utf-8")
+
+    def indexers_xml(self):
+        caps = CAPS.decode("utf-8").split("<caps>", 1)[1].rsplit("</caps>", 1)[0]
+        return ("<indexers>" + "".join(
+            f'<indexer id="idx{i}" configured="true"><title>Indexer {i}</title><caps>{caps}</caps></indexer>'
+            for i in range(self.indexers)) + "</indexers>").encode("utf-8")
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    # resolves come in bursts of a few hundred connections
+    request_queue_size = 1024
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    jackett = None
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, with Nagle every response would wait on a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        fake = self.jackett
+        with fake._lock:
+            fake.requests += 1
+
+        parts = urlsplit(self.path)
+        path = parts.path.strip("/").split("/")
+        if path[0] in ("dl", "torrent", "fail"):
+            if fake.download_latency:
+                time.sleep(fake.download_latency)
+            n = int(path[1].split(".")[0])
+            if path[0] == "dl":
+                self._send(302, b"", headers={"Location": f"magnet:?xt=urn:btih:{info_hash(n)}&dn=item{n}"})
+            elif path[0] == "torrent":
+                self._send(200, torrent_file(n), content_type="application/x-bittorrent")
+            else:
+                self._send(500, b"indexer is down")
+            return
+
+        if fake.latency:
+            time.sleep(fake.latency)
+
+        params = dict(parse_qsl(parts.query))
+        # /api/v2.0/indexers/<indexer>/results/torznab
+        indexer = path[3] if len(path) > 3 else "all"
+        if params.get("t") == "caps":
+            self._send(200, CAPS)
+        elif params.get("t") == "indexers":
+            self._send(200, fake.indexers_xml())
+        else:
+            self._send(200, fake.feed(indexer), content_type="application/rss+xml")
+
+    def _send(self, status, body, content_type="application/xml", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
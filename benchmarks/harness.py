@@ -0,0 +1,123 @@
+"""
+Helpers shared by the benchmarks: puts ``src`` and the Kodi/Elementum stubs on the path, times and measures calls and
+prints the results as a table.
+"""
+import json
+import logging
+import sys
+import time
+import tracemalloc
+from os import path
+
+BENCHMARKS = path.dirname(path.abspath(__file__))
+sys.path.insert(0, path.join(BENCHMARKS, "..", "src"))
+sys.path.insert(0, path.join(BENCHMARKS, "stubs"))
+
+from kodi_six import ADDON_ID, SETTINGS  # noqa: E402
+
+# keep the benchmarks away from anything cached by a previous run
+DEFAULT_SETTINGS = {
+    "api_key": "0123456789abcdef0123456789abcdef",
+    "caps_cache_ttl": 0,
+    "results_cache_enabled": False,
+    "magnet_cache_ttl": 0,
+    "search_deadline": 0,
+}
+
+
+def configure(verbose=False, **settings):
+    """Resets the addon settings to the benchmark defaults plus ``settings``"""
+    SETTINGS.clear()
+    SETTINGS.update(DEFAULT_SETTINGS)
+    SETTINGS.update(settings)
+    logging.basicConfig(format="%(message)s", level=logging.DEBUG if verbose else logging.ERROR)
+    # the addon picks its level from Kodi's debug setting, which the stubs leave off
+    logging.getLogger(ADDON_ID).setLevel(logging.DEBUG if verbose else logging.INFO)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Result(object):
+    """
+    ``durations`` are the timed runs, each processing ``units``. The percentiles are taken from ``timings``, which
+    default to the durations but can be finer grained, e.g. one per resolved link.
+    """
+
+    def __init__(self, stage, label, durations, units, peak_bytes=None, extra=None, timings=None):
+        self.stage = stage
+        self.label = label
+        self.durations = durations
+        self.timings = timings if timings is not None else durations
+        self.units = units
+        self.peak_bytes = peak_bytes
+        self.extra = extra or {}
+
+    @property
+    def throughput(self):
+        """Units per second, over all timed runs"""
+        total = sum(self.durations)
+        return self.units * len(self.durations) / total if total else float("inf")
+
+    def as_dict(self):
+        return {
+            "stage": self.stage,
+            "label": self.label,
+            "runs": len(self.durations),
+            "units": self.units,
+            "throughput": round(self.throughput, 1),
+            "p50_ms": round(percentile(self.timings, 50) * 1000, 3),
+            "p90_ms": round(percentile(self.timings, 90) * 1000, 3),
+            "p99_ms": round(percentile(self.timings, 99) * 1000, 3),
+            "peak_mb": None if self.peak_bytes is None else round(self.peak_bytes / 1024 / 1024, 2),
+            **self.extra,
+        }
+
+
+def measure(stage, label, func, units=1, repeat=5, warmup=1, memory=True, timings=None, extra=None):
+    """
+    Times ``repeat`` calls of ``func`` after ``warmup`` untimed ones. The peak memory is measured on one extra call,
+    tracemalloc slows everything down too much to do it on the timed ones. ``timings`` is a list ``func`` fills with
+    finer grained latencies, only the ones collected during the timed runs are kept.
+    """
+    for _ in range(warmup):
+        func()
+
+    if timings is not None:
+        del timings[:]
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+
+    timed = list(timings) if timings is not None else None
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return Result(stage, label, durations, units, peak, extra, timed)
+
+
+def report(results, json_file=None):
+    header = f"{'stage':<14} {'case':<22} {'runs':>5} {'throughput':>12} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} " \
+             f"{'peak MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        row = result.as_dict()
+        peak = "-" if row["peak_mb"] is None else f"{row['peak_mb']:.2f}"
+        print(f"{row['stage']:<14} {row['label']:<22} {row['runs']:>5} {row['throughput']:>10.1f}/s "
+              f"{row['p50_ms']:>9.2f} {row['p90_ms']:>9.2f} {row['p99_ms']:>9.2f} {peak:>8}")
+
+    if json_file:
+        with open(json_file, "w") as f:
+            json.dump([result.as_dict() for result in results], f, indent=2)
+        print(f"\nwrote {json_file}")
@@ -0,0 +1,27 @@
+"""The parts of Elementum's provider API the addon uses, reading settings from the kodi_six stub"""
+import xml.etree.ElementTree as ET
+from os import path
+
+from kodi_six import ROOT, SETTINGS
+
+_defaults = {
+    setting.get("id").rsplit(".", 1)[-1]: setting.get("default", "")
+    for setting in ET.parse(path.join(ROOT, "resources", "settings.xml")).getroot().iter("setting")
+    if setting.get("id")
+}
+
+
+def get_setting(key, converter=str, choices=None):
+    key = key.rsplit(".", 1)[-1]
+    value = SETTINGS.get(key, _defaults.get(key, ""))
+    if converter is bool:
+        return str(value).lower() in ("true", "1")
+    if choices:
+        return choices[int(value)]
+    if value == "" and converter is not str:
+        return converter(0)
+    return converter(value)
+
+
+def register(search, search_movie, search_episode, search_season=None):
+    pass
@@ -0,0 +1,94 @@
+"""
+Just enough of kodi_six for the addon modules to import and run outside of Kodi.
+
+Settings are kept in ``SETTINGS`` (without the addon prefix), the profile and temp directories live in a throwaway
+directory and Kodi's log goes to the ``kodi`` logger.
+"""
+import logging
+import os
+import sys
+import tempfile
+import types
+
+ADDON_ID = "script.elementum.jackett"
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".."))
+SPECIAL = tempfile.mkdtemp(prefix="jackett-bench-")
+SETTINGS = {}
+
+_kodi_log = logging.getLogger("kodi")
+
+
+class _Addon(object):
+    _info = {
+        "id": ADDON_ID,
+        "name": "Jackett",
+        "path": ROOT,
+        "icon": os.path.join(ROOT, "icon.png"),
+        "profile": f"special://profile/addon_data/{ADDON_ID}/",
+        "version": "0.0.0",
+    }
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def getAddonInfo(self, key):
+        return self._info.get(key, "")
+
+    def getLocalizedString(self, string_id):
+        return f"#{string_id} {{}}"
+
+    def getSetting(self, key):
+        return str(SETTINGS.get(key.rsplit(".", 1)[-1], ""))
+
+    def setSetting(self, key, value):
+        SETTINGS[key.rsplit(".", 1)[-1]] = value
+
+    def openSettings(self):
+        pass
+
+
+def _translate_path(path):
+    if path.startswith("special://"):
+        return os.path.join(SPECIAL, path[len("special://"):])
+    return path
+
+
+class _Dialog(object):
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+_levels = {
+    0: logging.DEBUG, 1: logging.INFO, 2: logging.INFO, 3: logging.WARNING, 4: logging.ERROR, 5: logging.CRITICAL,
+}
+
+xbmc = types.ModuleType("kodi_six.xbmc")
+xbmc.LOGDEBUG, xbmc.LOGINFO, xbmc.LOGWARNING, xbmc.LOGERROR, xbmc.LOGFATAL = 0, 1, 3, 4, 5
+xbmc.ISO_639_1 = 0
+xbmc.log = lambda msg, level=0: _kodi_log.log(_levels.get(level, logging.INFO), msg)
+xbmc.getLanguage = lambda *args: "en"
+xbmc.getCondVisibility = lambda condition: False
+xbmc.getInfoLabel = lambda label: ""
+xbmc.executeJSONRPC = lambda request: "{}"
+xbmc.sleep = lambda ms: None
+xbmc.Monitor = type("Monitor", (object,), {
+    "abortRequested": lambda self: False,
+    "waitForAbort": lambda self, t=0: True,
+})
+xbmc.Player = type("Player", (object,), {"isPlaying": lambda self: False})
+
+xbmcgui = types.ModuleType("kodi_six.xbmcgui")
+xbmcgui.Dialog = _Dialog
+xbmcgui.DialogProgressBG = _Dialog
+
+xbmcaddon = types.ModuleType("kodi_six.xbmcaddon")
+xbmcaddon.Addon = _Addon
+
+xbmcvfs = types.ModuleType("kodi_six.xbmcvfs")
+xbmcvfs.translatePath = _translate_path
+
+for _module in (xbmc, xbmcgui, xbmcaddon, xbmcvfs):
+    sys.modules[_module.__name__] = _module
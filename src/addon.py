@@ -5,7 +5,7 @@
 NAME = ADDON.getAddonInfo("name")
 PATH = ADDON.getAddonInfo("path")
 ICON = ADDON.getAddonInfo("icon")
-PROFILE = ADDON.getAddonInfo("profile")
+PROFILE = xbmcvfs.translatePath(ADDON.getAddonInfo("profile"))
 VERSION = ADDON.getAddonInfo("version")
 HOME = xbmcvfs.translatePath("special://home/addons/")
 TMP = xbmcvfs.translatePath("special://temp")
@@ -0,0 +1,269 @@
+# coding=utf-8
+"""
+A minimal asyncio HTTP/1.1 client and the event loop it runs on. Connections are kept alive and reused by the next
+request to the same host, like the ``requests`` sessions of the threaded client do.
+"""
+import asyncio
+import ssl
+import threading
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import urlencode, urlsplit, quote
+
+_loop = None
+_loop_lock = threading.Lock()
+_ssl_context = None
+
+_redirect_codes = (301, 302, 303, 307, 308)
+_read_size = 64 * 1024
+
+# idle connections by (scheme, host, port), only ever used on the loop's thread so they need no lock
+_idle = {}
+# idle connections kept per host, and for how long; servers close the ones idle for longer on their end anyway
+_max_idle = 16
+_idle_timeout = 30
+
+
+class _Connection(object):
+
+    def __init__(self, key, reader, writer):
+        self.key = key
+        self.reader = reader
+        self.writer = writer
+        self.idle_since = None
+
+    def reusable(self):
+        return not self.reader.at_eof() and not self.writer.is_closing() and \
+            time.monotonic() - self.idle_since < _idle_timeout
+
+    def close(self):
+        self.writer.close()
+
+
+class Response(object):
+    """
+    The parts of a response this addon looks at, named like their ``requests`` counterparts. ``fetch`` reads the body
+    into ``content``, a response from ``stream`` hands it out as it arrives with ``iter_chunks``.
+    """
+
+    def __init__(self, url, status_code, reason, headers, connection, keep_alive):
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        # header names are lower-cased
+        self.headers = headers
+        self.content = b""
+        # how long every read of the body may take, None to wait as long as it takes
+        self.timeout = None
+        self._connection = connection
+        self._keep_alive = keep_alive
+
+    @property
+    def is_redirect(self):
+        return self.status_code in _redirect_codes and 'location' in self.headers
+
+    async def iter_chunks(self, chunk_size):
+        """
+        Yields the body as it arrives, in chunks of at most ``chunk_size`` bytes. The connection goes back to the pool
+        once the body has been read to its end.
+        """
+        if self.status_code in (204, 304) or self.status_code < 200:
+            body = None
+        elif self.headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = self._chunked(chunk_size)
+        elif 'content-length' in self.headers:
+            body = self._sized(int(self.headers['content-length']), chunk_size)
+        else:
+            # the body ends with the connection
+            self._keep_alive = False
+            body = self._sized(None, chunk_size)
+
+        if body is not None:
+            async for chunk in body:
+                yield chunk
+        self._release()
+
+    async def read(self):
+        return b"".join([chunk async for chunk in self.iter_chunks(_read_size)])
+
+    def close(self):
+        """Closes the connection, unless the body was read to its end and it went back to the pool"""
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    async def _sized(self, length, chunk_size):
+        reader = self._connection.reader
+        while length is None or length > 0:
+            chunk = await self._wait(reader.read(chunk_size if length is None else min(chunk_size, length)))
+            if not chunk:
+                if length is not None:
+                    raise ConnectionError(f"connection closed with {length} bytes of {self.url} missing")
+                return
+            if length is not None:
+                length -= len(chunk)
+            yield chunk
+
+    async def _chunked(self, chunk_size):
+        reader = self._connection.reader
+        while True:
+            size = int((await self._wait(reader.readline())).split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                # skip the trailers
+                while (await self._wait(reader.readline())) not in (b'\r\n', b'\n', b''):
+                    pass
+                return
+            async for chunk in self._sized(size, chunk_size):
+                yield chunk
+            await self._wait(reader.readexactly(2))
+
+    def _wait(self, read):
+        return read if self.timeout is None else asyncio.wait_for(read, self.timeout)
+
+    def _release(self):
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        if not self._keep_alive:
+            connection.close()
+            return
+
+        idle = _idle.setdefault(connection.key, [])
+        if len(idle) >= _max_idle:
+            connection.close()
+            return
+        connection.idle_since = time.monotonic()
+        idle.append(connection)
+
+
+def loop():
+    """The event loop shared by everything in this process, running on its own daemon thread"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="aio-loop", daemon=True).start()
+
+        return _loop
+
+
+def submit(coro):
+    """Schedules a coroutine on the shared loop, returns a concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(coro, loop())
+
+
+async def fetch(url, params=None, headers=None, timeout=None):
+    """GETs ``url`` without following redirects and reads the whole body into ``content``"""
+    return await asyncio.wait_for(_fetch(_with_params(url, params), headers or {}), timeout)
+
+
+@asynccontextmanager
+async def stream(url, params=None, headers=None, timeout=None):
+    """
+    GETs ``url`` without following redirects and leaves the body to be read with ``Response.iter_chunks``. Like it
+    does for ``requests``, ``timeout`` applies to getting the headers and to every read of the body on its own.
+    """
+    response = await asyncio.wait_for(_request(_with_params(url, params), headers or {}), timeout)
+    response.timeout = timeout
+    try:
+        yield response
+    finally:
+        response.close()
+
+
+async def _fetch(url, headers):
+    response = await _request(url, headers)
+    try:
+        response.content = await response.read()
+    finally:
+        response.close()
+
+    return response
+
+
+def _with_params(url, params):
+    if params:
+        url = url + ('&' if '?' in url else '?') + urlencode(params)
+    return url
+
+
+async def _request(url, headers):
+    parts = urlsplit(url)
+    https = parts.scheme == 'https'
+    port = parts.port or (443 if https else 80)
+    target = quote(parts.path or '/', safe="/%:@!$&'()*+,;=~")
+    if parts.query:
+        target += '?' + quote(parts.query, safe="/%:@!$&'()*+,;=~?")
+
+    request_headers = {
+        'Host': parts.netloc,
+        'Accept-Encoding': 'identity',
+    }
+    request_headers.update(headers)
+    request = f"GET {target} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in request_headers.items()) + "\r\n"
+
+    key = (parts.scheme, parts.hostname, port)
+    while True:
+        connection, reused = _idle_connection(key), True
+        if connection is None:
+            reader, writer = await asyncio.open_connection(parts.hostname, port,
+                                                           ssl=_get_ssl_context() if https else None)
+            connection, reused = _Connection(key, reader, writer), False
+
+        try:
+            connection.writer.write(request.encode('latin-1'))
+            await connection.writer.drain()
+            status_line = await connection.reader.readline()
+        except OSError:
+            connection.close()
+            if reused:
+                continue
+            raise
+        except BaseException:
+            connection.close()
+            raise
+        if not status_line and reused:
+            # the server closed it while it was idle
+            connection.close()
+            continue
+        break
+
+    try:
+        status_line = status_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        if len(status_line) < 2 or not status_line[0].startswith('HTTP/'):
+            raise ConnectionError(f"invalid response from {parts.netloc}: {status_line}")
+        status_code = int(status_line[1])
+        reason = status_line[2] if len(status_line) > 2 else ''
+
+        response_headers = {}
+        while True:
+            line = await connection.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+    except BaseException:
+        connection.close()
+        raise
+
+    keep_alive = status_line[0] == 'HTTP/1.1' and response_headers.get('connection', '').lower() != 'close'
+    return Response(url, status_code, reason, response_headers, connection, keep_alive)
+
+
+def _idle_connection(key):
+    idle = _idle.get(key)
+    while idle:
+        connection = idle.pop()
+        if connection.reusable():
+            return connection
+        connection.close()
+
+    return None
+
+
+def _get_ssl_context():
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context()
+
+    return _ssl_context
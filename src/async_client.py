@@ -0,0 +1,267 @@
+# coding=utf-8
+import asyncio
+import concurrent.futures
+import http.client as httplib
+import queue
+import time
+
+import aio
+import torrent
+from client import ItemParser, Jackett, TorznabError
+from logger import log
+
+
+class AsyncJackett(Jackett):
+    """
+    Jackett client that makes its HTTP requests on the shared asyncio loop instead of on threads.
+
+    The caps fetch, the search requests, the indexers each of them searches and the magnet resolves all are coroutines
+    on one loop, responses are parsed as they arrive. The public methods block until they're done, everything still in
+    flight is cancelled when the deadline passes.
+    """
+
+    _timeout_errors = (asyncio.TimeoutError, concurrent.futures.TimeoutError, concurrent.futures.CancelledError)
+
+    # the coroutines stop at the deadline themselves, this is how much longer they're waited for before cancelling
+    _deadline_grace = 2
+
+    def _run(self, coro, timeout=None):
+        future = aio.submit(coro)
+        try:
+            return future.result(timeout=self._remaining() if timeout is None else timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    def _get(self, path, params):
+        timeout = self._remaining(self._request_timeout)
+        return self._run(aio.fetch(self._base_url + path, params=params, timeout=timeout))
+
+    def search_requests(self, requests):
+        if not requests:
+            return []
+
+        # they may have to be requested first, which can't be done from the loop
+        indexers = self.get_indexers() if self._search_per_indexer else None
+        timeout = self._remaining()
+        try:
+            return self._run(self._search_requests(requests, indexers),
+                             timeout=None if timeout is None else timeout + self._deadline_grace)
+        except concurrent.futures.TimeoutError:
+            log.warning(f"deadline passed, cancelled {len(requests)} search requests")
+            return []
+
+    def search_concurrently(self, *requests):
+        return self.search_requests(list(requests))
+
+    async def _search_requests(self, requests, indexers):
+        """Makes the search requests at the same time and merges their results in the order they arrive"""
+        if len(requests) == 1:
+            return await self._search_filtered_async(requests[0], indexers)
+
+        results = []
+        timeout = self._remaining(self._request_timeout)
+        tasks = [asyncio.ensure_future(self._search_filtered_async(request, indexers)) for request in requests]
+        try:
+            async for task in _completed(tasks, timeout):
+                try:
+                    results += task.result()
+                except Exception as exc:
+                    log.warning(f"search request generated an exception: {exc}")
+            pending = sum(1 for task in tasks if not task.done())
+            if pending:
+                log.warning(f"{pending} search request(s) did not finish within {timeout:.1f} seconds")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        return results
+
+    async def _search_filtered_async(self, request, indexers):
+        request_params, season = request
+        with self.stats.stage("request"):
+            results = await self._search_request_async(request_params, indexers)
+        return self._filter_season(results, season) if season else results
+
+    async def _search_request_async(self, request_params, indexers):
+        params = self._request_params(request_params)
+        results = self._cached_search(params)
+        if results is not None:
+            return results
+
+        if self._search_per_indexer:
+            results, complete = await self._search_indexers_async(params, indexers)
+            if complete:
+                self._cache_search(params, results)
+
+            return results
+
+        raw_chunks = [] if self._caches_search(params) else None
+        results, complete = await self._search_torznab_async("all", params, with_progress=True, raw_chunks=raw_chunks)
+        if results is None:
+            return []
+
+        log.info("Jackett returned response")
+        if complete:
+            self._cache_search(params, results, raw_chunks)
+
+        return results
+
+    async def _search_indexers_async(self, params, indexers):
+        """Same as _search_indexers, with a coroutine for every one of ``indexers``"""
+        searches = self._indexer_searches(indexers, params)
+        if not searches:
+            return [], True
+
+        deadline = self._remaining(self._deadline_for(searches.keys()))
+        log.info(f"Searching {len(searches)} indexers with a deadline of {deadline:.1f} seconds")
+
+        prog_from, prog_to = 0, 25
+        results, count, complete = [], 0, True
+        task_to_indexer = {
+            asyncio.ensure_future(self._search_indexer_async(indexer_id, indexer_params)): indexer_id
+            for indexer_id, indexer_params in searches.items()
+        }
+        try:
+            async for task in _completed(task_to_indexer, deadline):
+                count += 1
+                self._update_progress(prog_from, prog_to, count, len(searches))
+                indexer_id = task_to_indexer[task]
+                try:
+                    indexer_results, indexer_complete, latency = task.result()
+                except Exception as exc:
+                    log.warning(f"indexer {indexer_id} generated an exception: {exc}")
+                    complete = False
+                    continue
+                self._record_latency(indexer_id, latency)
+                complete = complete and indexer_complete
+                if indexer_results is None:
+                    continue
+                results += indexer_results
+
+            slow = [indexer_id for task, indexer_id in task_to_indexer.items() if not task.done()]
+            if slow:
+                complete = False
+                self._drop_indexers(slow, deadline)
+        finally:
+            for task in task_to_indexer:
+                task.cancel()
+
+        return results, complete
+
+    async def _search_indexer_async(self, indexer_id, params):
+        start = time.monotonic()
+        results, complete = await self._search_torznab_async(indexer_id, params, silent=True)
+
+        return results, complete, time.monotonic() - start
+
+    async def _search_torznab_async(self, indexer, params, with_progress=False, silent=False, raw_chunks=None):
+        """Same as _search_torznab, feeding the parser every chunk as soon as it arrives"""
+        if with_progress:
+            self._update_progress(0, 25, 0, 100)
+
+        if self._deadline_expired():
+            log.warning(f"deadline passed, not searching {indexer}")
+            return None, False
+
+        parser = ItemParser(self._parse_item)
+        try:
+            async with aio.stream(self._base_url + f"{indexer}/results/torznab", params=params,
+                                  timeout=self._remaining(self._request_timeout)) as resp:
+                if resp.status_code != httplib.OK:
+                    self._report_error(indexer, resp.reason, silent)
+                    return None, False
+
+                async for chunk in self._iter_chunks_async(resp, with_progress, raw_chunks):
+                    with self.stats.stage("parse"):
+                        parser.feed(chunk)
+        except asyncio.TimeoutError:
+            log.error(f"Jackett did not respond for {indexer} in time")
+            return None, False
+        except TorznabError as err:
+            self._report_error(indexer, err.description, silent, code=err.code)
+            return None, False
+
+        return self._parsed(parser), parser.complete
+
+    async def _iter_chunks_async(self, resp, with_progress=False, raw_chunks=None):
+        prog_from, prog_to = 0, 25
+        total_size = int(resp.headers.get('content-length', 0))
+        received = 0
+        chunks = resp.iter_chunks(self._chunk_size)
+        while True:
+            if self._deadline_expired():
+                log.warning(f"deadline passed after receiving {received} bytes, using what arrived so far")
+                return
+            # every read waits until the deadline at most, what arrived by then is used
+            resp.timeout = self._remaining(self._request_timeout)
+            start = time.perf_counter()
+            try:
+                chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                chunk = None
+            except asyncio.TimeoutError:
+                if not self._deadline_expired():
+                    raise
+                chunk = b""
+            self.stats.add_time("download", time.perf_counter() - start)
+            if chunk is None:
+                return
+            if not chunk:
+                continue
+            received += len(chunk)
+            if raw_chunks is not None:
+                raw_chunks.append(chunk)
+            if with_progress:
+                self._update_progress(prog_from, prog_to, received, total_size)
+            yield chunk
+
+    def _resolve_magnets(self, results):
+        if not results:
+            return
+
+        done = queue.Queue()
+
+        async def resolve(res):
+            start = time.perf_counter()
+            try:
+                done.put((res, await torrent.get_magnet_async(res.uri, self.deadline), None))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                done.put((res, None, exc))
+            self.stats.observe("resolve_time", time.perf_counter() - start)
+
+        async def resolve_all():
+            await asyncio.gather(*(resolve(res) for res in results))
+
+        future = aio.submit(resolve_all())
+        # wakes up the consumer below when everything is done or got cancelled
+        future.add_done_callback(lambda f: done.put(None))
+
+        for _ in range(len(results)):
+            try:
+                item = done.get(timeout=self._remaining())
+            except queue.Empty:
+                future.cancel()
+                log.warning("deadline passed while resolving magnets, cancelled the remaining resolves")
+                return
+
+            if item is None:
+                log.warning("magnet resolving was cancelled")
+                return
+            yield item
+
+
+async def _completed(tasks, timeout):
+    """Yields the tasks as they finish, until they all have or ``timeout`` seconds have passed"""
+    loop = asyncio.get_running_loop()
+    end = None if timeout is None else loop.time() + timeout
+    pending = set(tasks)
+    while pending:
+        done, pending = await asyncio.wait(pending, timeout=None if end is None else max(0.0, end - loop.time()),
+                                           return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            return
+        for task in done:
+            yield task
@@ -0,0 +1,211 @@
+# coding=utf-8
+"""
+Just enough bencode to turn a .torrent into a magnet link. The metainfo is scanned, not decoded: the ``info`` dict is
+only located so its bytes can be hashed, and of everything in it only the name and sizes are decoded. The piece
+hashes, which are most of a torrent file, are skipped over without being copied.
+"""
+import hashlib
+from urllib.parse import quote_plus
+
+
+class BencodeError(ValueError):
+    pass
+
+
+class _Incomplete(Exception):
+    """More data is needed to get past a value, ``_skip`` can carry on from ``pos`` and ``depth`` once it's there"""
+
+    def __init__(self, pos, depth):
+        super(_Incomplete, self).__init__(pos, depth)
+        self.pos = pos
+        self.depth = depth
+
+
+def _skip(buf, pos, depth=0):
+    """The position right after the value that starts at ``pos``, or the one ``depth`` containers up from it"""
+    end = len(buf)
+    while True:
+        if pos >= end:
+            raise _Incomplete(pos, depth)
+        c = buf[pos]
+        if c == 0x64 or c == 0x6c:  # d, l
+            depth += 1
+            pos += 1
+        elif c == 0x65:  # e
+            if depth == 0:
+                raise BencodeError(f"unexpected end at {pos}")
+            depth -= 1
+            pos += 1
+        elif c == 0x69:  # i
+            int_end = buf.find(b'e', pos)
+            if int_end < 0:
+                raise _Incomplete(pos, depth)
+            pos = int_end + 1
+        elif 0x30 <= c <= 0x39:
+            colon = buf.find(b':', pos)
+            if colon < 0:
+                raise _Incomplete(pos, depth)
+            string_end = colon + 1 + int(buf[pos:colon])
+            if string_end > end:
+                raise _Incomplete(pos, depth)
+            pos = string_end
+        else:
+            raise BencodeError(f"unexpected byte {c:#x} at {pos}")
+
+        if depth == 0:
+            return pos
+
+
+def _decode(buf, pos, skip=()):
+    """The value that starts at ``pos`` and the position after it, dict keys in ``skip`` are left out at any depth"""
+    c = buf[pos]
+    if 0x30 <= c <= 0x39:
+        colon = buf.find(b':', pos)
+        start = colon + 1
+        end = start + int(buf[pos:colon])
+        return bytes(buf[start:end]), end
+    if c == 0x69:  # i
+        end = buf.find(b'e', pos)
+        return int(buf[pos + 1:end]), end + 1
+    if c == 0x6c:  # l
+        pos += 1
+        items = []
+        while buf[pos] != 0x65:
+            item, pos = _decode(buf, pos, skip)
+            items.append(item)
+        return items, pos + 1
+    if c == 0x64:  # d
+        pos += 1
+        items = {}
+        while buf[pos] != 0x65:
+            key, pos = _decode(buf, pos)
+            if key in skip:
+                pos = _skip(buf, pos)
+            else:
+                items[key], pos = _decode(buf, pos, skip)
+        return items, pos + 1
+
+    raise BencodeError(f"unexpected byte {c:#x} at {pos}")
+
+
+class MetainfoScanner(object):
+    """
+    Finds the ``info`` dict of a .torrent file as it comes in. Feed it chunks until ``done``, everything after the
+    ``info`` dict is never needed. Only the keys of the top level dict are looked at, and a value that's cut off by
+    the end of a chunk is carried on with where the previous chunk left it.
+    """
+
+    # top level keys that make it into the magnet, they all sort before "info"
+    wanted = (b'announce', b'announce-list')
+    # what a magnet doesn't need of the info dict
+    info_skip = (b'pieces', b'path', b'path.utf-8', b'md5sum', b'attr')
+
+    def __init__(self):
+        self._buf = b''
+        # where the current top level key starts, and where its value starts and how far it's been skipped
+        self._pos = None
+        self._value = None
+        self._resume = None
+        self.values = {}
+        self.info_span = None
+
+    @property
+    def done(self):
+        return self.info_span is not None
+
+    def feed(self, chunk):
+        if not self._buf:
+            # a whole file in one chunk is scanned where it is
+            self._buf = chunk
+        else:
+            if not isinstance(self._buf, bytearray):
+                self._buf = bytearray(self._buf)
+            self._buf += chunk
+        buf = self._buf
+        if self._pos is None:
+            if not buf:
+                return False
+            if buf[0] != 0x64:
+                raise BencodeError("metainfo is not a dict")
+            self._pos = 1
+
+        try:
+            while not self.done:
+                pos = self._pos
+                if self._value is None:
+                    if pos >= len(buf):
+                        break
+                    if buf[pos] == 0x65:
+                        raise BencodeError("metainfo has no info dict")
+                    self._value = _skip(buf, pos)
+                    self._resume = (self._value, 0)
+
+                value_end = _skip(buf, *self._resume)
+                key = bytes(buf[buf.index(b':', pos) + 1:self._value])
+                if key == b'info':
+                    self.info_span = (self._value, value_end)
+                elif key in self.wanted:
+                    self.values[key] = _decode(buf, self._value)[0]
+                self._pos, self._value = value_end, None
+        except _Incomplete as e:
+            if self._value is not None:
+                self._resume = (e.pos, e.depth)
+        except ValueError as e:
+            raise BencodeError(str(e))
+
+        return self.done
+
+    def magnet(self):
+        """
+        The magnet link, in the same form torf makes it except for the web seeds: "url-list" sorts after "info" and the
+        file isn't read that far, so there's no ``ws=``
+        """
+        if not self.done:
+            raise BencodeError("metainfo is incomplete")
+
+        start, end = self.info_span
+        # hashed in place, the info dict can be megabytes of piece hashes
+        with memoryview(self._buf) as view:
+            info_hash = hashlib.sha1(view[start:end]).hexdigest()
+        info = _decode(self._buf, start, self.info_skip)[0]
+
+        parts = [f'xt=urn:btih:{info_hash}']
+        name = info.get(b'name')
+        if name is not None:
+            parts.append('dn=' + quote_plus(name.decode('utf-8', 'replace'), safe=''))
+        if b'length' in info:
+            size = info[b'length']
+        else:
+            size = sum(f.get(b'length', 0) for f in info.get(b'files', ()))
+        if size:
+            parts.append(f'xl={size}')
+        for tracker in self.trackers():
+            parts.append('tr=' + quote_plus(tracker.decode('utf-8', 'replace'), safe=''))
+
+        return 'magnet:?' + '&'.join(parts)
+
+    def trackers(self):
+        """The announce urls, tiers flattened, "announce" first if it's not in "announce-list" already"""
+        trackers = []
+        for tier in self.values.get(b'announce-list', ()):
+            for url in tier:
+                if url not in trackers:
+                    trackers.append(url)
+        announce = self.values.get(b'announce')
+        if announce and announce not in trackers:
+            trackers.insert(0, announce)
+        return trackers
+
+
+def magnet_from_chunks(chunks):
+    """The magnet of a .torrent file, read from ``chunks`` only as far as its ``info`` dict"""
+    scanner = MetainfoScanner()
+    for chunk in chunks:
+        if scanner.feed(chunk):
+            return scanner.magnet()
+
+    raise BencodeError("metainfo is incomplete")
+
+
+def magnet_from_torrent(content):
+    return magnet_from_chunks((content,))
@@ -0,0 +1,170 @@
+# coding=utf-8
+"""
+Persistent caches stored in the addon profile directory
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import addon
+from logger import log
+
+_DB_FILE = "cache.sqlite"
+
+_lock = threading.RLock()
+_conn = None
+
+
+def _connection():
+    global _conn
+    if _conn is None:
+        os.makedirs(addon.PROFILE, exist_ok=True)
+        _conn = sqlite3.connect(os.path.join(addon.PROFILE, _DB_FILE), timeout=5, check_same_thread=False,
+                                isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.execute("""
+            CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value BLOB NOT NULL,
+                raw INTEGER NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                expires REAL NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        _conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed ON cache (namespace, accessed)")
+    return _conn
+
+
+class Cache(object):
+    """
+    A namespaced key/value store backed by a single SQLite database in the addon profile.
+
+    Values are stored as JSON, unless they are ``bytes`` in which case they are stored as is. Entries past their
+    ``ttl`` are still returned by ``get_entry`` (flagged as stale) for another ``stale_ttl`` seconds, so callers can
+    serve them while refreshing. When ``max_entries`` is set, the least recently used entries are evicted on write.
+    """
+
+    # SQLite limits the number of variables in a single statement
+    _batch_size = 500
+
+    def __init__(self, namespace, ttl, stale_ttl=0, max_entries=None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        if entry is None or entry[1]:
+            return None
+
+        return entry[0]
+
+    def get_entry(self, key):
+        """Returns a tuple ``(value, is_stale)`` or ``None`` if there is no usable entry"""
+        now = time.time()
+        try:
+            with _lock:
+                conn = _connection()
+                row = conn.execute("SELECT value, raw, expires FROM cache WHERE namespace = ? AND key = ?",
+                                   (self.namespace, key)).fetchone()
+                if row is None:
+                    return None
+
+                value, raw, expires = row
+                if now > expires + self.stale_ttl:
+                    conn.execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                    return None
+
+                if self.max_entries:
+                    conn.execute("UPDATE cache SET accessed = ? WHERE namespace = ? AND key = ?",
+                                 (now, self.namespace, key))
+        except sqlite3.Error as e:
+            log.warning(f"cache {self.namespace}: unable to read {key}: {e}")
+            return None
+
+        return (bytes(value) if raw else json.loads(value)), now > expires
+
+    def get_many(self, keys):
+        """Returns a dict with the fresh entries of the given keys, looked up in batches"""
+        now = time.time()
+        keys = list(keys)
+        found = {}
+        try:
+            with _lock:
+                conn = _connection()
+                for i in range(0, len(keys), self._batch_size):
+                    batch = keys[i:i + self._batch_size]
+                    rows = conn.execute(
+                        f"SELECT key, value, raw FROM cache WHERE namespace = ? AND expires >= ? "
+                        f"AND key IN ({','.join('?' * len(batch))})",
+                        [self.namespace, now] + batch).fetchall()
+                    for key, value, raw in rows:
+                        found[key] = bytes(value) if raw else json.loads(value)
+                    if self.max_entries and rows:
+                        conn.executemany("UPDATE cache SET accessed = ? WHERE namespace = ? AND key = ?",
+                                         [(now, self.namespace, row[0]) for row in rows])
+        except sqlite3.Error as e:
+            log.warning(f"cache {self.namespace}: unable to read {len(keys)} keys: {e}")
+
+        return found
+
+    def set(self, key, value, ttl=None):
+        self.set_many({key: value}, ttl=ttl)
+
+    def set_many(self, items, ttl=None):
+        """Writes all items in a single transaction"""
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        rows = []
+        for key, value in items.items():
+            raw = isinstance(value, (bytes, bytearray, memoryview))
+            data = bytes(value) if raw else json.dumps(value, separators=(',', ':'))
+            rows.append((self.namespace, key, data, int(raw), now, now + ttl, now))
+
+        if not rows:
+            return
+
+        try:
+            with _lock:
+                conn = _connection()
+                conn.execute("BEGIN")
+                try:
+                    conn.executemany("INSERT OR REPLACE INTO cache "
+                                     "(namespace, key, value, raw, created, expires, accessed) "
+                                     "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                    if self.max_entries:
+                        self._evict(conn)
+                    conn.execute("COMMIT")
+                except sqlite3.Error:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            log.warning(f"cache {self.namespace}: unable to write {len(rows)} entries: {e}")
+
+    def delete(self, key):
+        try:
+            with _lock:
+                _connection().execute("DELETE FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+        except sqlite3.Error as e:
+            log.warning(f"cache {self.namespace}: unable to delete {key}: {e}")
+
+    def clear(self):
+        try:
+            with _lock:
+                _connection().execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+        except sqlite3.Error as e:
+            log.warning(f"cache {self.namespace}: unable to clear: {e}")
+
+    def _evict(self, conn):
+        conn.execute("""
+            DELETE FROM cache WHERE namespace = ? AND key IN (
+                SELECT key FROM cache WHERE namespace = ? ORDER BY accessed DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.namespace, self.namespace, self.max_entries))
@@ -0,0 +1,79 @@
+# coding=utf-8
+"""
+Release name classification
+"""
+import re
+from collections import OrderedDict
+
+UNKNOWN = 'unknown'
+
+resolutions = OrderedDict([
+    ('4k', [r'4k', r'2160[p]', r'uhd', r'4k', r'hd4k']),
+    ('2k', [r'1440[p]', r'2k']),
+    ('1080p', [r'1080[ip]', r'1920x1080', r'hd1080p?', r'fullhd', r'fhd', r'blu\W*ray', r'bd\W*remux']),
+    ('720p', [r'720[p]', r'1280x720', r'hd720p?', r'hd\-?rip', r'b[rd]rip']),
+    ('480p', [r'480[p]', r'xvid', r'dvd', r'dvdrip', r'hdtv', r'web\-(dl)?rip', r'iptv', r'sat\-?rip',
+              r'tv\-?rip']),
+    ('240p', [r'240[p]', r'vhs\-?rip']),
+    (UNKNOWN, []),
+])
+
+release_types = OrderedDict([
+    ('brrip', [r'brrip', r'bd\-?rip', r'blu\-?ray', r'bd\-?remux']),
+    ('webdl', [r'web', r'web_?\-?dl', r'web\-?rip', r'dl\-?rip', r'yts']),
+    ('hdrip', [r'hd\-?rip']),
+    ('hdtv', [r'hd\-?tv']),
+    ('dvd', [r'dvd', r'dvd\-?rip', r'vcd\-?rip', r'divx', r'xvid']),
+    ('dvdscr', [r'dvd\-?scr(eener)?']),
+    ('screener', [r'screener', r'scr']),
+    ('3d', [r'3d']),
+    ('telesync', [r'telesync', r'ts', r'tc']),
+    ('cam', [r'cam(\-rip)?', r'hd\-?cam']),
+    ('tvrip', [r'tv\-?rip', r'sat\-?rip', r'dvb']),
+    ('vhsrip', [r'vhs\-?rip']),
+    ('iptvrip', [r'iptv\-?rip']),
+    ('trailer', [r'trailer']),
+    ('workprint', [r'workprint']),
+    ('line', [r'line']),
+    ('h26x', [r'x26[45]']),
+    (UNKNOWN, [])
+])
+
+_capturing_group_re = re.compile(r'(?<!\\)\((?!\?)')
+
+
+class Classifier(object):
+    """
+    Classifies a name against an ordered table of categories in a single scan.
+
+    The patterns of every category are compiled into one regex, one named group per category, wrapped in a lookahead
+    so every position right after a non-word character is tried. When several categories match, the one listed first
+    in the table wins, no matter where in the name it was found.
+    """
+
+    def __init__(self, table, default=UNKNOWN):
+        self.default = default
+        self.categories = [category for category, patterns in table.items() if patterns]
+        # the lowest rank goes to the last entry of the table, so better categories rank higher
+        self.ranks = {category: rank for rank, category in enumerate(reversed(list(table.keys())))}
+
+        groups = [
+            f'(?P<c{i}>' + "|".join(_capturing_group_re.sub('(?:', p) for p in table[category]) + ')'
+            for i, category in enumerate(self.categories)
+        ]
+        self._regex = re.compile(r'(?<=\W)(?=' + "|".join(groups) + ')', re.IGNORECASE)
+
+    def classify(self, name):
+        best = None
+        for match in self._regex.finditer(name):
+            index = int(match.lastgroup[1:])
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+
+        return self.default if best is None else self.categories[best]
+
+
+resolution_classifier = Classifier(resolutions)
+release_type_classifier = Classifier(release_types)
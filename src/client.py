@@ -1,21 +1,84 @@
 #!/usr/bin/env python3.6
 # coding=utf-8
 import concurrent.futures
+import hashlib
 import http.client as httplib
-import os
+import json
+import logging
 import re
+import threading
+import time
 import xml.etree.ElementTree as ET
 from urllib.parse import urljoin
 from xml.etree import ElementTree
 
+import requests
 from kodi_six import xbmcgui
+from requests.adapters import HTTPAdapter
 from requests_toolbelt import sessions
 
 import torrent
 import utils
-from logger import log
-from utils import notify, translation, get_icon_path, human_size, get_resolution, get_release_type, get_setting, \
-    set_setting
+from cache import Cache
+from logger import log, Payload
+from result import Result
+from stats import Stats
+from utils import notify, translation, get_icon_path, get_resolution, get_release_type, get_setting, set_setting
+
+# a process keeps one session per Jackett, so a long-lived one (the daemon) reuses its connections across searches
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+class TorznabError(Exception):
+    """Jackett answered with a torznab <error> document"""
+
+    def __init__(self, code, description):
+        super(TorznabError, self).__init__(f"got code {code}: {description}")
+        self.code = code
+        self.description = description
+
+
+class ItemParser(object):
+    """
+    Parses a torznab response fed to it in chunks while it's still arriving. Every <item> is parsed with
+    ``parse_item`` as soon as it's closed and dropped from the tree afterwards, so only the item being parsed is held in
+    memory. Raises TorznabError as soon as the root turns out to be an <error>.
+    """
+
+    def __init__(self, parse_item):
+        self.results = []
+        self.count = 0
+        # whether the response was parsed to its end, not cut off
+        self.complete = False
+        self._parse_item = parse_item
+        self._parser = ET.XMLPullParser(events=("start", "end"))
+        self._root = None
+        self._channel = None
+
+    def feed(self, chunk):
+        self._parser.feed(chunk)
+        for event, elem in self._parser.read_events():
+            if event == "start":
+                if self._root is None:
+                    self._root = elem
+                    if elem.tag == "error":
+                        raise TorznabError(elem.attrib.get("code"), elem.attrib.get("description"))
+                elif elem.tag == "channel":
+                    self._channel = elem
+            elif elem.tag == "item":
+                self.count += 1
+                result = self._parse_item(elem)
+                if result is not None:
+                    self.results.append(result)
+                if self._channel is not None:
+                    self._channel.remove(elem)
+                else:
+                    elem.clear()
+
+    def close(self):
+        self._parser.close()
+        self.complete = True
 
 
 class Jackett(object):
@@ -28,6 +91,7 @@ class Jackett(object):
             "title": "name",
             "jackettindexer": "provider",
             "size": "size",
+            "guid": "guid",
         },
         "torznab_attrs": {
             "magneturl": "uri",
@@ -37,14 +101,97 @@ class Jackett(object):
         }
     }
 
-    def __init__(self, host, api_key, p_dialog: xbmcgui.DialogProgressBG = None):
+    # caps that are past their TTL are still used for up to a week while they're refreshed in the background
+    _caps_stale_ttl = 7 * 24 * 60 * 60
+
+    # torznab search type -> setting holding the number of minutes its results are cached for
+    _results_cache_ttl_settings = {
+        "movie": "results_cache_movie_ttl",
+        "tvsearch": "results_cache_show_ttl",
+        "search": "results_cache_query_ttl",
+    }
+    _results_cache_max_entries = 200
+    # raw responses are much bigger than the parsed results, so keep less of them around
+    _raw_results_cache_max_entries = 25
+
+    # search types and the caps tag that tells whether an indexer supports them
+    _search_type_caps = {
+        "movie": "movie-search",
+        "tvsearch": "tv-search",
+        "search": "search",
+    }
+    # indexers are waited on for this multiple of the slowest one's usual response time, see _deadline_for
+    _indexer_deadline_factor = 1.5
+    _indexer_deadline_min = 3
+    _indexer_latency_ttl = 30 * 24 * 60 * 60
+    # weight of a new latency measurement in an indexer's moving average
+    _indexer_latency_weight = 0.3
+    _indexer_max_workers = 32
+    _chunk_size = 64 * 1024
+    # what the HTTP layer raises when a request takes longer than the request timeout
+    _timeout_errors = (requests.exceptions.Timeout,)
+
+    _magnet_cache_max_entries = 5000
+    # failures are often temporary (tracker down, timeouts), so don't remember them for long
+    _magnet_cache_negative_ttl = 60 * 60
+
+    def __init__(self, host, api_key, p_dialog: xbmcgui.DialogProgressBG = None, use_cached_caps=True,
+                 deadline: utils.Deadline = None, stats: Stats = None):
         super(Jackett, self).__init__()
         self.p_dialog = p_dialog
+        self.deadline = deadline
+        self.stats = stats if stats is not None else Stats()
         self._api_key = api_key
         self._caps = {}
 
-        self._session = sessions.BaseUrlSession(base_url=urljoin(host, "/api/v2.0/indexers/"))
-        self.get_caps()
+        self._base_url = urljoin(host, "/api/v2.0/indexers/")
+        self._session = _session(self._base_url, self._indexer_max_workers)
+
+        api_key_fingerprint = hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+        self._caps_cache_key = f"{host}|{api_key_fingerprint}"
+        self._indexers_cache_key = f"{self._caps_cache_key}|indexers"
+        self._caps_cache = Cache("caps", ttl=get_setting('caps_cache_ttl', int) * 60 * 60,
+                                 stale_ttl=self._caps_stale_ttl)
+
+        self._request_timeout = get_setting('search_timeout', int)
+        self._search_per_indexer = get_setting('search_per_indexer', bool)
+        self._indexer_deadline = get_setting('indexer_deadline', int)
+        self._indexer_latency = Cache("indexer_latency", ttl=self._indexer_latency_ttl)
+        self._magnet_cache = Cache("magnets", ttl=get_setting('magnet_cache_ttl', int) * 24 * 60 * 60,
+                                   max_entries=self._magnet_cache_max_entries)
+        self._use_results_cache = get_setting('results_cache_enabled', bool)
+        self._results_cache = Cache("result_rows", ttl=0, max_entries=self._results_cache_max_entries)
+        self._raw_results_cache = Cache("results_raw", ttl=0, max_entries=self._raw_results_cache_max_entries)
+
+        if use_cached_caps:
+            self._load_caps()
+        else:
+            self._caps_cache.delete(self._caps_cache_key)
+            self.get_caps()
+
+    def _load_caps(self):
+        if self._caps_cache.ttl <= 0:
+            self.get_caps()
+            return
+
+        entry = self._caps_cache.get_entry(self._caps_cache_key)
+        if entry is None:
+            log.debug("no cached capabilities, requesting them from Jackett")
+            self.get_caps()
+            return
+
+        caps, is_stale = entry
+        self._caps = caps
+        self.stats.count("caps_cache_hits")
+        log.debug("loaded capabilities from cache; stale=%s", is_stale)
+        if is_stale:
+            threading.Thread(target=self._refresh_caps, name="caps-refresh").start()
+
+    def _refresh_caps(self):
+        try:
+            self.get_caps()
+        except Exception as e:
+            log.warning(f"Unable to refresh capabilities in the background: {e}")
 
     def get_error(self, content):
         xml = ET.ElementTree(ET.fromstring(content)).getroot()
@@ -54,7 +201,11 @@ def get_error(self, content):
         return None
 
     def get_caps(self):
-        caps_resp = self._session.get("all/results/torznab", params={"t": "caps", "apikey": self._api_key})
+        with self.stats.stage("caps"):
+            self._get_caps()
+
+    def _get_caps(self):
+        caps_resp = self._get("all/results/torznab", params={"t": "caps", "apikey": self._api_key})
 
         if caps_resp.status_code != httplib.OK:
             notify(translation(32700).format(caps_resp.reason), image=get_icon_path())
@@ -76,17 +227,65 @@ def get_caps(self):
         # todo handle gracefully, doesn't exist for individual trackers
         # self._caps["limits"] = xml.find("limits").attrib
 
-        self._caps["search_tags"] = {}
-        for type_tag in xml.findall('searching/*'):
-            self._caps["search_tags"][type_tag.tag] = {
+        caps = {"search_tags": self._parse_search_tags(xml)}
+
+        self._caps = caps
+        if self._caps_cache.ttl > 0:
+            self._caps_cache.set(self._caps_cache_key, caps)
+
+        log.info(f"Found capabilities: {self._caps}")
+        # todo maybe categories are needed?
+
+    @staticmethod
+    def _parse_search_tags(caps_xml):
+        search_tags = {}
+        for type_tag in caps_xml.findall('searching/*'):
+            search_tags[type_tag.tag] = {
                 "enabled": type_tag.attrib["available"] == "yes",
                 "params": [p for p in type_tag.attrib['supportedParams'].split(",") if p],
             }
 
-        log.info(f"Found capabilities: {self._caps}")
-        # todo maybe categories are needed?
+        return search_tags
 
-    def search_movie(self, title, year, imdb_id):
+    def get_indexers(self):
+        """Returns the configured indexers with their own capabilities, cached like the aggregate caps"""
+        if self._caps_cache.ttl > 0:
+            entry = self._caps_cache.get_entry(self._indexers_cache_key)
+            if entry is not None:
+                indexers, is_stale = entry
+                if is_stale:
+                    threading.Thread(target=self._request_indexers, name="indexers-refresh").start()
+                return indexers
+
+        return self._request_indexers()
+
+    def _request_indexers(self):
+        content = self._request_torznab("all", {"t": "indexers", "configured": "true", "apikey": self._api_key})
+        if content is None:
+            return []
+
+        indexers = []
+        for indexer in ET.fromstring(content).findall("indexer"):
+            caps = indexer.find("caps")
+            if caps is None:
+                continue
+            indexers.append({
+                "id": indexer.attrib["id"],
+                "title": indexer.findtext("title", indexer.attrib["id"]),
+                "search_tags": self._parse_search_tags(caps),
+            })
+
+        log.info(f"Found {len(indexers)} configured indexers")
+        if self._caps_cache.ttl > 0:
+            self._caps_cache.set(self._indexers_cache_key, indexers)
+
+        return indexers
+
+    # A search request is a ``(request_params, season)`` tuple. When ``season`` is set, only the season packs of it
+    # are kept from the results.
+
+    def movie_requests(self, title, year, imdb_id):
+        """The requests a movie search makes"""
         if "search_tags" not in self._caps:
             notify(translation(32701), image=get_icon_path())
             return []
@@ -96,7 +295,7 @@ def search_movie(self, title, year, imdb_id):
             notify(translation(32702).format("movie"), image=get_icon_path())
             log.warning("Jackett has no movie capabilities, please add a indexer that has movie capabilities. "
                         "Falling back to query search...")
-            return self.search_query(title + ' ' + str(year))
+            return self.query_requests(title + ' ' + str(year))
 
         # todo what values are possible for imdb_id?
         movie_params = movie_search_caps["params"]
@@ -105,16 +304,17 @@ def search_movie(self, title, year, imdb_id):
         }
 
         has_imdb_caps = 'imdbid' in movie_params
-        log.debug(f"movie search; imdb_id={imdb_id}, has_imdb_caps={has_imdb_caps}")
+        log.debug("movie search; imdb_id=%s, has_imdb_caps=%s", imdb_id, has_imdb_caps)
         if imdb_id and has_imdb_caps and get_setting('search_by_imdb_key', bool):
             request_params["imdbid"] = imdb_id
         else:
             request_params["q"] = title + ' ' + str(year)
-            log.debug(f"searching movie with query={request_params['q']}")
+            log.debug("searching movie with query=%s", request_params['q'])
 
-        return self._do_search_request(request_params)
+        return [(request_params, None)]
 
-    def search_shows(self, title, season=None, episode=None, imdb_id=None):
+    def show_requests(self, title, season=None, episode=None, imdb_id=None):
+        """The requests a show, season or episode search makes"""
         if "search_tags" not in self._caps:
             notify(translation(32701), image=get_icon_path())
             return []
@@ -131,12 +331,13 @@ def search_shows(self, title, season=None, episode=None, imdb_id=None):
                 if bool(episode):
                     title_ep = "{}E{:0>2}".format(title_ep, episode)
 
-            results = self.search_query(title_ep)
             if get_setting("search_season_on_episode", bool) and bool(season) and bool(episode):
                 season_query = re.escape("{:0>2}".format(season))
-                results = results + self._filter_season(self.search_query("{} S{}".format(title, season_query)), season)
+                return self.query_requests(title_ep) + [
+                    (params, season) for params, _ in self.query_requests("{} S{}".format(title, season_query))
+                ]
 
-            return results
+            return self.query_requests(title_ep)
 
         # todo what values are possible for imdb_id?
         tv_params = tv_search_caps["params"]
@@ -144,24 +345,85 @@ def search_shows(self, title, season=None, episode=None, imdb_id=None):
             "t": "tvsearch",
         }
         has_imdb_caps = 'imdbid' in tv_params
-        log.debug(f"movie search; imdb_id={imdb_id}, has_imdb_caps={has_imdb_caps}")
+        log.debug("tv search; imdb_id=%s, has_imdb_caps=%s", imdb_id, has_imdb_caps)
         if imdb_id and has_imdb_caps and get_setting('search_by_imdb_key', bool):
             request_params["imdbid"] = imdb_id
         else:
-            log.debug(f"searching tv show with query={title}, season={season}, episode={episode}")
+            log.debug("searching tv show with query=%s, season=%s, episode=%s", title, season, episode)
             request_params["q"] = title
             if bool(season) and 'season' in tv_params:
                 request_params["season"] = season
             if bool(episode) and 'ep' in tv_params:
                 request_params["ep"] = episode
 
-        results = self._do_search_request(request_params)
         if get_setting("search_season_on_episode", bool) and 'season' in request_params and 'ep' in request_params:
-            del request_params['ep']
-            results = results + self._filter_season(self._do_search_request(request_params), season)
+            season_params = request_params.copy()
+            del season_params['ep']
+            return [(request_params, None), (season_params, season)]
+
+        return [(request_params, None)]
+
+    def query_requests(self, query):
+        """The requests a query search makes"""
+        if not self._caps["search_tags"]['search']:
+            notify(translation(32702).format("query"), image=get_icon_path())
+            log.warning("Jackett has no search capabilities, please add a indexer that has search capabilities.")
+            return []
+
+        request_params = {
+            "q": query
+        }
+
+        return [(request_params, None)]
+
+    def search_movie(self, title, year, imdb_id):
+        return self.search_requests(self.movie_requests(title, year, imdb_id))
+
+    def search_shows(self, title, season=None, episode=None, imdb_id=None):
+        return self.search_requests(self.show_requests(title, season=season, episode=episode, imdb_id=imdb_id))
+
+    def search_season(self, title, season, imdb_id):
+        return self.search_shows(title, season=season, imdb_id=imdb_id)
+
+    def search_episode(self, title, season, episode, imdb_id):
+        return self.search_shows(title, season=season, episode=episode, imdb_id=imdb_id)
+
+    def search_query(self, query):
+        return self.search_requests(self.query_requests(query))
+
+    def search_requests(self, requests):
+        """Makes the search requests, several of them at the same time, and merges their results"""
+        if not requests:
+            return []
+        if len(requests) == 1:
+            return self._search_filtered(*requests[0])
+
+        return self.search_concurrently(*requests)
+
+    def search_concurrently(self, *requests):
+        """Makes all search requests at the same time and merges their results in the order they arrive"""
+        results = []
+        timeout = self._remaining(self._request_timeout)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(requests), thread_name_prefix="search")
+        futures = [executor.submit(self._search_filtered, *request) for request in requests]
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=timeout):
+                try:
+                    results += future.result()
+                except Exception as exc:
+                    log.warning(f"search request generated an exception: {exc}")
+        except concurrent.futures.TimeoutError:
+            pending = sum(1 for f in futures if not f.done())
+            log.warning(f"{pending} search request(s) did not finish within {timeout:.1f} seconds")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
 
         return results
 
+    def _search_filtered(self, request_params, season):
+        results = self._do_search_request(request_params)
+        return self._filter_season(results, season) if season else results
+
     def _filter_season(self, results, season):
         season_query = re.escape("{:0>2}".format(season))
         s_re = re.compile(r'\bS(eason[\s.]?)?' + season_query + r'\b', re.IGNORECASE)
@@ -169,85 +431,350 @@ def _filter_season(self, results, season):
 
         return [
             result for result in results
-            if s_re.search(result['name']) and not ep_re.search(result['name'])
+            if s_re.search(result.name) and not ep_re.search(result.name)
         ]
 
-    def search_season(self, title, season, imdb_id):
-        return self.search_shows(title, season=season, imdb_id=imdb_id)
+    def _remaining(self, limit=None):
+        if self.deadline is None:
+            return limit
 
-    def search_episode(self, title, season, episode, imdb_id):
-        return self.search_shows(title, season=season, episode=episode, imdb_id=imdb_id)
+        return self.deadline.remaining(limit)
 
-    def search_query(self, query):
-        if not self._caps["search_tags"]['search']:
-            notify(translation(32702).format("query"), image=get_icon_path())
-            log.warning("Jackett has no search capabilities, please add a indexer that has search capabilities.")
-            return []
+    def _deadline_expired(self):
+        return self.deadline is not None and self.deadline.expired()
 
-        request_params = {
-            "q": query
-        }
+    def _get(self, path, params):
+        return self._session.get(path, params=params, timeout=self._remaining(self._request_timeout))
 
-        return self._do_search_request(request_params)
-
-    def _get_with_progress(self, *args, **kwargs):
-        if not self.p_dialog:
-            r = self._session.get(*args, **kwargs)
-            return r, r.content
+    def _open_stream(self, path, params):
+        return self._session.get(path, params=params, stream=True, timeout=self._remaining(self._request_timeout))
 
+    def _iter_chunks(self, resp, with_progress=False, raw_chunks=None):
         prog_from, prog_to = 0, 25
-        self._update_progress(prog_from, prog_to, 0, 100)
+        total_size = int(resp.headers.get('content-length', 0))
+        received = 0
+        chunks = resp.iter_content(self._chunk_size)
+        while True:
+            if self._deadline_expired():
+                log.warning(f"deadline passed after receiving {received} bytes, using what arrived so far")
+                return
+            # the time spent waiting on the network is accounted separately from the parsing
+            start = time.perf_counter()
+            try:
+                chunk = next(chunks, None)
+            except requests.exceptions.ConnectionError:
+                # iter_content raises a read that timed out as a ConnectionError, not as a Timeout
+                if not self._deadline_expired():
+                    raise
+                chunk = b""
+            self.stats.add_time("download", time.perf_counter() - start)
+            if chunk is None:
+                return
+            if not chunk:
+                continue
+            received += len(chunk)
+            if raw_chunks is not None:
+                raw_chunks.append(chunk)
+            if with_progress:
+                self._update_progress(prog_from, prog_to, received, total_size)
+            yield chunk
 
-        r = self._session.get(stream=True, *args, **kwargs)
-        total_size = int(r.headers.get('content-length', 0))
-        search_resp = b""
-        for chunk in r.iter_content(64 * 1024):
-            if chunk:
-                search_resp += chunk
-                self._update_progress(prog_from, prog_to, len(search_resp), total_size)
+    def _do_search_request(self, request_params):
+        with self.stats.stage("request"):
+            return self._search_request(request_params)
 
-        return r, search_resp
+    def _search_request(self, request_params):
+        params = self._request_params(request_params)
+        results = self._cached_search(params)
+        if results is not None:
+            return results
 
-    def _do_search_request(self, request_params):
+        if self._search_per_indexer:
+            results, complete = self._search_indexers(params)
+            if complete:
+                self._cache_search(params, results)
+
+            return results
+
+        raw_chunks = [] if self._caches_search(params) else None
+        results, complete = self._search_torznab("all", params, with_progress=True, raw_chunks=raw_chunks)
+        if results is None:
+            return []
+
+        log.info("Jackett returned response")
+        # a response the deadline cut off would be served as the whole one
+        if complete:
+            self._cache_search(params, results, raw_chunks)
+
+        return results
+
+    def _request_params(self, request_params):
+        """The params of a request to Jackett, with the API key"""
         params = request_params.copy()
         if "apikey" not in params:
             params["apikey"] = self._api_key
 
+        return params
+
+    def _caches_search(self, params):
+        return self._use_results_cache and self._results_cache_ttl(params) > 0
+
+    def _cached_search(self, params):
+        """The results of an earlier search with the same params, or None"""
+        if self._caches_search(params):
+            cache_key = self._results_cache_key(params)
+            rows = self._results_cache.get(cache_key)
+            if rows is not None:
+                results = [Result.from_row(row) for row in rows]
+                log.info(f"Found {len(results)} cached results for {cache_key}")
+                self.stats.count("results_cache_hits")
+                return results
+
+            content = self._raw_results_cache.get(cache_key)
+            if content is not None:
+                log.info(f"Found cached response for {cache_key}")
+                self.stats.count("results_cache_hits")
+                results = self._parse_items(content)
+                self._cache_results(cache_key, results, self._results_cache_ttl(params))
+                return results
+
         censored_params = params.copy()
         censored_key = censored_params['apikey']
         censored_params['apikey'] = "{}{}{}".format(censored_key[0:2], "*" * 26, censored_key[-4:])
         log.info(f"Making a request to Jackett using params {censored_params}")
+        return None
 
-        search_resp, content = self._get_with_progress("all/results/torznab", params=params)
-        if search_resp.status_code != httplib.OK:
-            notify(translation(32700).format(search_resp.reason), image=get_icon_path())
-            log.error(f"Jackett returned {search_resp.reason}")
-            return []
+    def _cache_search(self, params, results, raw_chunks=None):
+        if not self._caches_search(params):
+            return
+
+        cache_key, cache_ttl = self._results_cache_key(params), self._results_cache_ttl(params)
+        if raw_chunks is not None:
+            self._raw_results_cache.set(cache_key, b"".join(raw_chunks), ttl=cache_ttl)
+        self._cache_results(cache_key, results, cache_ttl)
+
+    def _cache_results(self, cache_key, results, ttl):
+        self._results_cache.set(cache_key, [result.to_row() for result in results], ttl=ttl)
+
+    def _search_torznab(self, indexer, params, with_progress=False, silent=False, raw_chunks=None):
+        """
+        Streams a torznab search and parses its items while the response is still arriving. Returns the results, None
+        if Jackett returned an error, and whether the response was read to its end. The received chunks are appended
+        to ``raw_chunks`` when given.
+        """
+        if with_progress:
+            self._update_progress(0, 25, 0, 100)
+
+        if self._deadline_expired():
+            log.warning(f"deadline passed, not searching {indexer}")
+            return None, False
+
+        parser = ItemParser(self._parse_item)
+        try:
+            with self._open_stream(f"{indexer}/results/torznab", params=params) as resp:
+                if resp.status_code != httplib.OK:
+                    self._report_error(indexer, resp.reason, silent)
+                    return None, False
+
+                self._feed(parser, self._iter_chunks(resp, with_progress, raw_chunks))
+        except self._timeout_errors:
+            log.error(f"Jackett did not respond for {indexer} in time")
+            return None, False
+        except TorznabError as err:
+            self._report_error(indexer, err.description, silent, code=err.code)
+            return None, False
+
+        return self._parsed(parser), parser.complete
+
+    def _report_error(self, indexer, reason, silent=False, code=None):
+        if not silent:
+            notify(translation(32700).format(reason), image=get_icon_path())
+        if code is not None:
+            log.error(f"got code {code} for {indexer}: {reason}")
+        else:
+            log.error(f"Jackett returned {reason} for {indexer}")
+
+    def _request_torznab(self, indexer, params):
+        """Returns the body of a non-search torznab response, or None if Jackett returned an error"""
+        if self._deadline_expired():
+            log.warning(f"deadline passed, not requesting {params.get('t')} from {indexer}")
+            return None
+
+        try:
+            resp = self._get(f"{indexer}/results/torznab", params=params)
+        except self._timeout_errors:
+            log.error(f"Jackett did not respond for {indexer} in time")
+            return None
+
+        if resp.status_code != httplib.OK:
+            self._report_error(indexer, resp.reason)
+            return None
 
-        err = self.get_error(content)
+        err = self.get_error(resp.content)
         if err is not None:
-            notify(translation(32700).format(err["description"]), image=get_icon_path())
-            log.error(f"got code {err['code']}: {err['description']}")
-            return []
+            self._report_error(indexer, err["description"], code=err["code"])
+            return None
 
-        log.info("Jackett returned response")
-        log.debug("===============================")
-        log.debug(content)
-        log.debug("===============================")
+        return resp.content
 
-        return self._parse_items(content)
+    def _search_indexers(self, params):
+        """
+        Searches every configured indexer on its own endpoint at the same time. Indexers that don't answer before the
+        deadline are dropped. Returns the results and whether every indexer answered in time.
+        """
+        searches = self._indexer_searches(self.get_indexers(), params)
+        if not searches:
+            return [], True
 
-    def _parse_items(self, resp_content):
-        results = []
-        xml = ET.ElementTree(ET.fromstring(resp_content))
-        items = xml.getroot().findall("channel/item")
-        log.info(f"Found {len(items)} items from response")
-        for item in items:
-            result = self._parse_item(item)
-            if result is not None:
-                results.append(result)
+        deadline = self._remaining(self._deadline_for(searches.keys()))
+        log.info(f"Searching {len(searches)} indexers with a deadline of {deadline:.1f} seconds")
 
-        return results
+        prog_from, prog_to = 0, 25
+        results, count, complete = [], 0, True
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(len(searches), self._indexer_max_workers), thread_name_prefix="indexer")
+        future_to_indexer = {
+            executor.submit(self._search_indexer, indexer_id, indexer_params): indexer_id
+            for indexer_id, indexer_params in searches.items()
+        }
+        try:
+            for future in concurrent.futures.as_completed(future_to_indexer, timeout=deadline):
+                count += 1
+                self._update_progress(prog_from, prog_to, count, len(searches))
+                indexer_id = future_to_indexer[future]
+                try:
+                    indexer_results, indexer_complete, latency = future.result()
+                except Exception as exc:
+                    log.warning(f"indexer {indexer_id} generated an exception: {exc}")
+                    complete = False
+                    continue
+                # only indexers that answered in time are recorded here, the slow ones get the deadline below
+                self._record_latency(indexer_id, latency)
+                complete = complete and indexer_complete
+                if indexer_results is None:
+                    continue
+                results += indexer_results
+        except concurrent.futures.TimeoutError:
+            complete = False
+            self._drop_indexers([indexer_id for future, indexer_id in future_to_indexer.items() if not future.done()],
+                                deadline)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return results, complete
+
+    def _indexer_searches(self, indexers, params):
+        """The params to search each of ``indexers`` that can handle the search with, by indexer id"""
+        searches = {}
+        for indexer in indexers:
+            indexer_params = self._indexer_params(indexer, params)
+            if indexer_params is None:
+                log.debug("indexer %s can't handle %s search, skipping", indexer['id'], params.get('t', 'search'))
+                continue
+            searches[indexer["id"]] = indexer_params
+
+        if not searches:
+            log.warning("None of the configured indexers support this search")
+        return searches
+
+    def _drop_indexers(self, slow, deadline):
+        # only indexers that answered in time have their latency recorded as it was, the slow ones get the deadline
+        for indexer_id in slow:
+            self._record_latency(indexer_id, deadline)
+        log.warning(f"Dropped {len(slow)} indexers that did not answer within {deadline:.1f} seconds: "
+                    f"{', '.join(slow)}")
+
+    def _search_indexer(self, indexer_id, params):
+        """Returns the indexer's results, whether they're all of them and how long it took to answer"""
+        start = time.monotonic()
+        results, complete = self._search_torznab(indexer_id, params, silent=True)
+
+        return results, complete, time.monotonic() - start
+
+    def _indexer_params(self, indexer, params):
+        search_type = params.get("t", "search")
+        caps = indexer["search_tags"].get(self._search_type_caps.get(search_type, "search"))
+        if not caps or not caps["enabled"]:
+            return None
+
+        supported = set(caps["params"]) | {"t", "apikey"}
+        indexer_params = {k: v for k, v in params.items() if k in supported}
+        if not any(k in indexer_params for k in caps["params"]):
+            return None
+
+        dropped = sorted(k for k in params if k not in supported)
+        if dropped:
+            log.debug("indexer %s doesn't support %s, searching without", indexer["id"], ", ".join(dropped))
+
+        return indexer_params
+
+    def _deadline_for(self, indexer_ids):
+        """
+        Waits for the slowest indexer's usual response time, with some headroom, but never longer than the configured
+        deadline. Indexers that usually exceed the configured deadline don't extend it.
+        """
+        latencies = []
+        for indexer_id in indexer_ids:
+            latency = self._indexer_latency.get(indexer_id)
+            if latency is None:
+                return self._indexer_deadline
+            if latency < self._indexer_deadline:
+                latencies.append(latency)
+
+        if not latencies:
+            return self._indexer_deadline
+
+        adaptive = max(latencies) * self._indexer_deadline_factor
+        return min(self._indexer_deadline, max(adaptive, self._indexer_deadline_min))
+
+    def _record_latency(self, indexer_id, latency):
+        previous = self._indexer_latency.get(indexer_id)
+        if previous is not None:
+            latency = previous + self._indexer_latency_weight * (latency - previous)
+        self._indexer_latency.set(indexer_id, latency)
+        log.debug("indexer %s latency average is now %.2f seconds", indexer_id, latency)
+
+    def _results_cache_key(self, params):
+        normalized = {
+            k: " ".join(str(v).lower().split())
+            for k, v in params.items()
+            if k != "apikey" and v is not None
+        }
+        return self._base_url + "|" + json.dumps(normalized, sort_keys=True, separators=(',', ':'))
+
+    def _results_cache_ttl(self, params):
+        setting = self._results_cache_ttl_settings.get(params.get("t", "search"))
+        if setting is None:
+            return 0
+
+        return get_setting(setting, int) * 60
+
+    def _parse_items(self, resp_content):
+        """Parses a torznab response given either as bytes or as an iterable of chunks"""
+        if isinstance(resp_content, (bytes, bytearray)):
+            resp_content = (resp_content,)
+
+        parser = ItemParser(self._parse_item)
+        self._feed(parser, resp_content)
+        return self._parsed(parser)
+
+    def _feed(self, parser, chunks):
+        with self.stats.stage("parse"):
+            for chunk in chunks:
+                parser.feed(chunk)
+
+    def _parsed(self, parser):
+        """The results of a response that's been fed to ``parser`` to its end"""
+        try:
+            parser.close()
+        except ET.ParseError:
+            # the response was cut off at the deadline, the items parsed until then are still good
+            if not self._deadline_expired():
+                raise
+        self.stats.count("items", parser.count)
+
+        log.info(f"Found {parser.count} items from response")
+        return parser.results
 
     #  if we didn't get a magnet uri, attempt to resolve the magnet uri.
     #  todo for some reason Elementum cannot resolve the link that gets proxied through Jackett.
@@ -258,53 +785,114 @@ def async_magnet_resolve(self, results):
         prog_from, prog_to = 25, 90
         self.p_dialog.update(prog_from, message=translation(32751).format(size))
 
-        failed, count = 0, 0
-        with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() * 10) as executor:
-            future_to_magnet = {executor.submit(torrent.get_magnet, res["uri"]): res for res in results}
-            for future in concurrent.futures.as_completed(future_to_magnet):
-                count += 1
-                self._update_progress(prog_from, prog_to, count, size)
+        to_resolve = []
+        for res in results:
+            if not res.uri.startswith("magnet:"):
+                to_resolve.append(res)
+            elif not res.info_hash:
+                res.info_hash = _info_hash(res.uri)
+
+        use_cache = self._magnet_cache.ttl > 0
+        if use_cache:
+            to_resolve = self._apply_cached_magnets(to_resolve)
+
+        resolved, unresolved = {}, {}
+        failed, count = 0, size - len(to_resolve)
+        for res, magnet, exc in self._resolve_magnets(to_resolve):
+            count += 1
+            self._update_progress(prog_from, prog_to, count, size)
+            key = self._magnet_cache_key(res)
+            if exc is not None:
+                log.warning('%r generated an exception: %s', res, exc)
+                failed += 1
+                unresolved[key] = {"magnet": None}
+                continue
+
+            if not magnet:
+                unresolved[key] = {"magnet": None}
+                continue
+            log.debug("torrent: %s magnet uri %s overridden by %s", res.name, res.uri, magnet)
+            res.uri = magnet
+            if not res.info_hash:
+                res.info_hash = _info_hash(res.uri)
+            resolved[key] = {"magnet": magnet, "info_hash": res.info_hash}
+
+        if use_cache:
+            self._magnet_cache.set_many(resolved)
+            self._magnet_cache.set_many(unresolved, ttl=self._magnet_cache_negative_ttl)
+
+        self.stats.count("resolve_failed", failed)
+        self.stats.count("resolve_empty", len(unresolved) - failed)
+        if failed:
+            log.warning(f"Failed to resolve {failed} magnet links")
+        return results
+
+    def _resolve_magnets(self, results):
+        """Yields ``(result, magnet, exception)`` for every result as soon as it has been resolved"""
+        resolver = torrent.resolver()
+        future_to_magnet = {
+            resolver.submit(self._timed_get_magnet, res.uri): res
+            for res in results
+        }
+        try:
+            for future in concurrent.futures.as_completed(future_to_magnet, timeout=self._remaining()):
                 res = future_to_magnet[future]
                 try:
                     magnet = future.result()
                 except Exception as exc:
-                    log.warning('%r generated an exception: %s', res, exc)
-                    failed += 1
-                else:
-                    if not magnet:
-                        continue
-                    log.debug(f"torrent: {res['name']} magnet uri {res['uri']} overridden by {magnet}")
-                    res["uri"] = magnet
-                    if not res["info_hash"]:
-                        res["info_hash"] = torrent.get_info_hash(res['uri'])
-
-        log.warning(f"Failed to resolve {failed} magnet links")
-        return results
+                    yield res, None, exc
+                    continue
+
+                yield res, magnet, None
+        except concurrent.futures.TimeoutError:
+            pending = [future for future in future_to_magnet if not future.done()]
+            for future in pending:
+                future.cancel()
+            log.warning(f"deadline passed while resolving magnets, cancelled {len(pending)} resolves")
+
+    def _timed_get_magnet(self, uri):
+        start = time.perf_counter()
+        try:
+            return torrent.get_magnet(uri, self.deadline)
+        finally:
+            self.stats.observe("resolve_time", time.perf_counter() - start)
+
+    @staticmethod
+    def _magnet_cache_key(res):
+        return res.guid or res.uri
+
+    def _apply_cached_magnets(self, results):
+        """Fills in the magnets that were resolved before, returns the results that still need resolving"""
+        cached = self._magnet_cache.get_many({self._magnet_cache_key(res) for res in results})
+        to_resolve, hits, misses = [], 0, 0
+        for res in results:
+            entry = cached.get(self._magnet_cache_key(res))
+            if entry is None:
+                to_resolve.append(res)
+                continue
+
+            if entry["magnet"] is None:
+                misses += 1
+                continue
+
+            hits += 1
+            res.uri = entry["magnet"]
+            if not res.info_hash:
+                res.info_hash = entry["info_hash"]
+
+        self.stats.count("magnet_cache_hits", hits)
+        self.stats.count("magnet_cache_known_failures", misses)
+        log.info(f"Found {hits} cached magnets and {misses} known failures, {len(to_resolve)} left to resolve")
+        return to_resolve
 
     def _update_progress(self, pfrom, pto, current, total):
-        if not self.p_dialog:
+        if not self.p_dialog or not total:
             return
 
         self.p_dialog.update(int((pfrom + (pto - pfrom) * (current / total)) // 1))
 
     def _parse_item(self, item):
-        result = {
-            "name": None,
-            "provider": "Unknown",
-            "size": "Unknown",
-            "uri": None,
-            "seeds": "0",
-            "peers": "0",
-            "info_hash": "",
-            "language": None,
-
-            # todo would be nice to assign correct icons but that can be very time consuming due to the number
-            #  of indexers in Jackett
-            "icon": get_icon_path(),
-
-            "_size_bytes": -1
-        }
-
+        fields = {}
         for ref in item:
             tag = ref.tag
             attrib = ref.attrib
@@ -312,17 +900,17 @@ def _parse_item(self, item):
                 val = attrib["value"]
                 if "name" in attrib and "value" in attrib and attrib["name"] and val and \
                         attrib["name"] in self._torznab_elementum_mappings["torznab_attrs"]:
-                    json = self._torznab_elementum_mappings["torznab_attrs"][attrib["name"]]
-                    result[json] = val
+                    field = self._torznab_elementum_mappings["torznab_attrs"][attrib["name"]]
+                    fields[field] = val
                 continue
 
             if ref.tag in self._torznab_elementum_mappings["tags"] and ref.text is not None:
-                json = self._torznab_elementum_mappings["tags"][ref.tag]
+                field = self._torznab_elementum_mappings["tags"][ref.tag]
                 val = ref.text.strip()
 
-                result[json] = val
+                fields[field] = val
 
-        if result["uri"] is None:
+        if "uri" not in fields:
             link = item.find('link')
             jackett_uri = ""
             if link is not None:
@@ -333,31 +921,52 @@ def _parse_item(self, item):
                     jackett_uri = enclosure.attrib['url']
 
             if jackett_uri != "":
-                result["uri"] = jackett_uri
-
-        # if not result["info_hash"]:
-        #     result["info_hash"] = torrent.get_info_hash(result['uri'])
+                fields["uri"] = jackett_uri
 
-        if result["name"] is None or result["uri"] is None:
-            log.warning(f"Could not parse item; name = {result['name']}; uri = {result['uri']}")
-            log.debug(f"Failed item is: {ElementTree.tostring(item, encoding='utf8')}")
+        name, uri = fields.get("name"), fields.get("uri")
+        if name is None or uri is None:
+            log.warning(f"Could not parse item; name = {name}; uri = {uri}")
+            if log.isEnabledFor(logging.DEBUG):
+                log.debug("Failed item is: %s", Payload(ElementTree.tostring(item, encoding='utf8')))
             return None
 
-        provider_color = utils.get_provider_color(result["provider"])
+        # name = name.decode("utf-8") # might be needed for non-english items
+        result = Result(
+            name,
+            fields.get("provider", "Unknown"),
+            uri,
+            info_hash=fields.get("info_hash", ""),
+            seeds=int(fields.get("seeds", 0)),
+            peers=int(fields.get("peers", 0)),
+            size=int(fields["size"]) if "size" in fields else -1,
+            resolution=get_resolution(name),
+            release_type=get_release_type(name),
+            guid=fields.get("guid"),
+        )
+
+        log.debug("final item: %r", result)
 
-        # result["name"] = result["name"].decode("utf-8") # might be needed for non-english items
-        result["seeds"] = int(result["seeds"])
-        result["peers"] = int(result["peers"])
-        resolution = get_resolution(result["name"])
-        result["resolution"] = list(utils.resolutions.keys())[::-1].index(resolution)
-        result["_resolution"] = resolution
-        result["release_type"] = get_release_type(result["name"])
-        result["provider"] = f'[COLOR {provider_color}]{result["provider"]}[/COLOR]'
+        return result
 
-        if result["size"] != "Unknown":
-            result["_size_bytes"] = int(result["size"])
-            result["size"] = human_size(result["_size_bytes"])
 
-        log.debug("final item: {}".format(result))
+def _info_hash(magnet):
+    """The info hash of a magnet link, empty if the link is malformed so one bad item doesn't fail the search"""
+    try:
+        return torrent.get_info_hash(magnet)
+    except Exception as e:
+        log.debug("unable to get the info hash of %s: %s", magnet, e)
+        return ""
 
-        return result
+
+def _session(base_url, pool_size):
+    """The shared session for ``base_url``, its pool keeps a connection for each request that can run at once"""
+    with _sessions_lock:
+        session = _sessions.get(base_url)
+        if session is None:
+            session = sessions.BaseUrlSession(base_url=base_url)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[base_url] = session
+
+        return session
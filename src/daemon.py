@@ -0,0 +1,134 @@
+# coding=utf-8
+"""
+Searches run by the background service on behalf of the provider script. The service's process lives as long as Kodi,
+so its connection pools, resolver threads, caches and imports are warm for every search, while the script Elementum
+starts for each search only forwards the payload and hands back the results.
+
+The service listens on a localhost TCP port, AF_UNIX isn't there on every platform Kodi runs on. The port and a token
+the script has to send along are written to a file in the addon profile, one JSON line goes each way.
+"""
+import hmac
+import json
+import os
+import secrets
+import socket
+import socketserver
+import threading
+import traceback
+
+import addon
+from logger import log
+from utils import get_setting
+
+DAEMON_FILE = "daemon.json"
+
+# how long the script waits for the service to accept a search before running it itself
+_connect_timeout = 1
+# added to the search deadline for the results to come back, and how long they take at most without a deadline
+_response_slack = 15
+_response_timeout = 60
+
+
+def _daemon_file():
+    return os.path.join(addon.PROFILE, DAEMON_FILE)
+
+
+def enabled():
+    return get_setting('daemon_enabled', bool)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError as e:
+            log.warning(f"daemon: invalid request: {e}")
+            return
+        if not hmac.compare_digest(str(request.get("token", "")), self.server.token):
+            log.warning("daemon: request with an invalid token")
+            return
+
+        import jackett
+        log.debug("daemon: %s search", request["method"])
+        try:
+            response = {"results": jackett.search_or_raise(request["payload"], request["method"])}
+        except Exception as e:
+            # the script searches itself then
+            log.error(f"daemon: {request['method']} search failed: {traceback.format_exc()}")
+            response = {"error": str(e) or type(e).__name__}
+        self.wfile.write(json.dumps(response, separators=(',', ':')).encode("utf-8") + b"\n")
+
+
+class Server(socketserver.ThreadingTCPServer):
+    """Serves searches from a thread of its own until ``stop``"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super(Server, self).__init__(("127.0.0.1", 0), _Handler)
+        self.token = secrets.token_hex(16)
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="daemon")
+        self._thread.start()
+
+        os.makedirs(addon.PROFILE, exist_ok=True)
+        path = _daemon_file()
+        with open(path + ".tmp", "w") as f:
+            json.dump({"port": self.server_address[1], "token": self.token, "pid": os.getpid()}, f)
+        os.replace(path + ".tmp", path)
+        log.info(f"daemon: listening on port {self.server_address[1]}")
+
+    def stop(self):
+        try:
+            with open(_daemon_file()) as f:
+                if json.load(f).get("token") == self.token:
+                    os.remove(_daemon_file())
+        except (OSError, ValueError):
+            pass
+
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+        log.info("daemon: stopped")
+
+
+def forward(payload, method):
+    """The results of a search run by the daemon, or None if it isn't there to run it"""
+    try:
+        with open(_daemon_file()) as f:
+            info = json.load(f)
+        sock = socket.create_connection(("127.0.0.1", info["port"]), timeout=_connect_timeout)
+    except (OSError, ValueError, KeyError) as e:
+        log.debug("daemon: not running (%s)", e)
+        return None
+
+    request = {"token": info["token"], "method": method, "payload": payload}
+    deadline = get_setting('search_deadline', int)
+    try:
+        with sock:
+            sock.settimeout(deadline + _response_slack if deadline > 0 else _response_timeout)
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as response:
+                line = response.readline()
+        response = json.loads(line)
+        if "error" in response:
+            log.warning(f"daemon: the search failed there ({response['error']}), searching here")
+            return None
+        return response["results"]
+    except (OSError, ValueError, KeyError) as e:
+        log.warning(f"daemon: no results from the daemon ({e!r}), searching here")
+        return None
+
+
+def search(payload, method="general"):
+    """Runs a search on the daemon if it's enabled and running, here otherwise"""
+    if enabled():
+        results = forward(payload, method)
+        if results is not None:
+            return results
+
+    import jackett
+    return jackett.search(payload, method)
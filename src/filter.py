@@ -1,6 +1,11 @@
 # coding=utf-8
+import re
+import sys
+import time
+
+from classifier import UNKNOWN, resolutions, release_types
 from logger import log
-from utils import get_setting, UNKNOWN
+from utils import get_setting
 
 
 #
@@ -56,28 +61,128 @@
 #         }[setting]
 #     )
 
-def keywords(results):
-    block_keywords = get_setting('keywords_block').split(",")
-    require_keywords = get_setting('keywords_require').split(",")
+class Plan(object):
+    """
+    The filters enabled for a search, built from a single read of the settings. All of them are applied to every
+    result in one pass.
+    """
+
+    def __init__(self, method):
+        self.filters = []
+
+        if get_setting('filter_keywords_enabled', bool):
+            self.filters.append(("keywords", keywords()))
+
+        if get_setting('filter_size_enabled', bool):
+            self.filters.append(("size", size(method)))
+
+        if get_setting('filter_include_resolution_enabled', bool):
+            self.filters.append(("resolution", resolution()))
+
+        if get_setting('filter_include_release', bool):
+            self.filters.append(("release type", release_type()))
+
+        if get_setting('filter_exclude_no_seed', bool):
+            self.filters.append(("no seeds", seed()))
+
+    def __str__(self):
+        return ", ".join(name for name, _ in self.filters) or "no filters"
+
+    def apply(self, results, stats=None):
+        """Keeps the results every filter accepts. With ``stats``, the time spent in each filter is recorded too"""
+        if stats is not None:
+            return self._apply_timed(results, stats)
+
+        rejected = {name: 0 for name, _ in self.filters}
+        filtered = []
+        for result in results:
+            for name, predicate in self.filters:
+                if not predicate(result):
+                    rejected[name] += 1
+                    break
+            else:
+                filtered.append(result)
+
+        self._log_rejected(rejected)
+        return filtered
+
+    def _apply_timed(self, results, stats):
+        rejected = {name: 0 for name, _ in self.filters}
+        took = {name: 0.0 for name, _ in self.filters}
+        clock = time.perf_counter
+        filtered = []
+        for result in results:
+            for name, predicate in self.filters:
+                start = clock()
+                accepted = predicate(result)
+                took[name] += clock() - start
+                if not accepted:
+                    rejected[name] += 1
+                    break
+            else:
+                filtered.append(result)
+
+        for name, _ in self.filters:
+            stats.add_time("filter." + name, took[name])
+            stats.count("rejected." + name, rejected[name])
+        self._log_rejected(rejected)
+        return filtered
+
+    @staticmethod
+    def _log_rejected(rejected):
+        for name, count in rejected.items():
+            log.info(f"filtering {name} removed {count} results")
+
+
+def _split_keywords(setting):
+    return [word.strip() for word in get_setting(setting).split(",") if word.strip()]
+
+
+def _keyword_pattern(word, whole_word):
+    """``*`` matches any run of characters and ``?`` any single character, everything else is literal"""
+    pattern = re.escape(word).replace(r'\*', '.*?').replace(r'\?', '.')
+    if whole_word:
+        # dots, dashes and underscores separate words in release names, so \b isn't good enough
+        pattern = r'(?<![^\W_])' + pattern + r'(?![^\W_])'
 
-    for word in block_keywords:
-        results = [
-            result
-            for result in results
-            if word in result["name"]
-        ]
+    return pattern
 
-    for word in require_keywords:
-        results = [
-            result
-            for result in results
-            if word not in result["name"]
-        ]
 
-    return results
+def keywords():
+    flags = re.IGNORECASE if get_setting('keywords_ignore_case', bool) else 0
+    whole_word = get_setting('keywords_whole_word', bool)
+    block_keywords = _split_keywords('keywords_block')
+    require_keywords = _split_keywords('keywords_require')
 
+    block_re = None
+    if block_keywords:
+        block_re = re.compile("|".join(_keyword_pattern(w, whole_word) for w in block_keywords), flags)
 
-def size(method, results):
+    require_re, require_res = None, []
+    if require_keywords:
+        # a zero-width lookahead tries every position, the named group tells which keyword matched there
+        require_re = re.compile("(?=" + "|".join(
+            f'(?P<k{i}>{_keyword_pattern(w, whole_word)})' for i, w in enumerate(require_keywords)
+        ) + ")", flags)
+        require_res = [re.compile(_keyword_pattern(w, whole_word), flags) for w in require_keywords]
+
+    def predicate(result):
+        name = result.name
+        if block_re is not None and block_re.search(name):
+            return False
+
+        if require_re is not None:
+            found = {m.lastgroup for m in require_re.finditer(name)}
+            if len(found) < len(require_res):
+                # a keyword can be hidden by another one that matches at the same position, so double check
+                return all(f'k{i}' in found or r.search(name) for i, r in enumerate(require_res))
+
+        return True
+
+    return predicate
+
+
+def size(method):
     include_unknown = get_setting('size_include_' + UNKNOWN, bool)
 
     if method in ["movie", "season", "episode"]:
@@ -91,38 +196,88 @@ def size(method, results):
     min_size = min_size * (1024 * 1024 * 1024)
     max_size = max_size * (1024 * 1024 * 1024)
 
-    return [
-        result
-        for result in results
-        if (size == -1 and include_unknown) or (size != -1 and min_size <= result["_size_bytes"] <= max_size)
-    ]
+    def predicate(result):
+        size_bytes = result.size
+        if size_bytes == -1:
+            return include_unknown
 
+        return min_size <= size_bytes <= max_size
 
-def resolution(results):
-    filtered = []
-    for result in results:
-        log.debug(f"res {result['name']}: name={result['_resolution']}; id={result['resolution']}")
-        if get_setting('include_resolution_' + result["_resolution"], bool):
-            filtered.append(result)
+    return predicate
+
+
+def resolution():
+    allowed = frozenset(res for res in resolutions if get_setting('include_resolution_' + res, bool))
+    log.debug("allowed resolutions: %s", sorted(allowed))
 
-    return filtered
+    return lambda result: result.resolution in allowed
 
 
-def seed(results):
-    return [
-        result
-        for result in results
-        if result["seeds"] > 0
-    ]
+def seed():
+    return lambda result: result.seeds > 0
 
 
 def unique(results):
-    return list({v['info_hash'].lower(): v for v in results}.values())
+    """
+    Merges the results that are the same torrent, recognized by their info hash, taken from the torznab attribute or
+    parsed from the magnet link, or by their GUID. Runs before resolving so every torrent is resolved only once. The
+    first result found is kept, with the most seeds and peers of its duplicates, all their providers and a magnet link
+    if any of them had one. Results that can't be identified are all kept.
+    """
+    kept_by_key = {}
+    kept = []
+    for result in results:
+        keys = _identities(result)
+        first = next((kept_by_key[key] for key in keys if key in kept_by_key), None)
+        if first is None:
+            kept.append(result)
+            first = result
+        else:
+            _merge(first, result)
+
+        for key in keys:
+            kept_by_key.setdefault(key, first)
+
+    return kept
+
+
+def _identities(result):
+    """Keys identifying a result's torrent, also fills in its info hash from its magnet link"""
+    if result.info_hash:
+        result.info_hash = result.info_hash.lower()
+    elif result.uri.startswith("magnet:"):
+        # imported here, filtering shouldn't have to load requests
+        import torrent
+        try:
+            result.info_hash = torrent.get_info_hash(result.uri)
+        except Exception as e:
+            log.debug("unable to get the info hash of %s: %s", result.uri, e)
+
+    keys = []
+    if result.info_hash:
+        keys.append(result.info_hash)
+    if result.guid:
+        keys.append("guid:" + result.guid)
+    return keys
+
+
+def _merge(kept, duplicate):
+    kept.seeds = max(kept.seeds, duplicate.seeds)
+    kept.peers = max(kept.peers, duplicate.peers)
+    # the icon stays the first provider's, the label lists them all
+    providers = (kept.providers or kept.provider).split(", ")
+    added = [provider for provider in (duplicate.providers or duplicate.provider).split(", ")
+             if provider not in providers]
+    if added:
+        kept.providers = sys.intern(", ".join(providers + added))
+    if not kept.info_hash:
+        kept.info_hash = duplicate.info_hash
+    if not kept.uri.startswith("magnet:") and duplicate.uri.startswith("magnet:"):
+        kept.uri = duplicate.uri
+
 
+def release_type():
+    allowed = frozenset(rel for rel in release_types if get_setting('include_release_' + rel, bool))
+    log.debug("allowed release types: %s", sorted(allowed))
 
-def release_type(results):
-    return [
-        result
-        for result in results
-        if get_setting('include_release_' + result["release_type"], bool)
-    ]
+    return lambda result: result.release_type in allowed
@@ -12,16 +12,29 @@
 
 import addon
 import filter
+import prefetch
+import ranking
 import utils
-from client import Jackett
-from logger import log
+from logger import log, Payload
+from stats import Stats
 from utils import get_setting
 
 available_providers = 0
 special_chars = "()\"':.[]<>/\\?"
 
+# share of extra results that are resolved to make up for failures and duplicates, with a minimum
+_resolve_margin = 0.25
+_resolve_margin_min = 5
 
-def get_client(p_dialog: xbmcgui.DialogProgressBG = None):
+# results that failed to resolve returned at most, Elementum can't resolve the links Jackett proxies itself
+_unresolved_max = 1
+
+# most titles searched with at once, the search title included
+_max_title_variants = 4
+
+
+def get_client(p_dialog: xbmcgui.DialogProgressBG = None, use_cached_caps=True, deadline: utils.Deadline = None,
+               stats: Stats = None):
     host = urlparse(get_setting('host'))
     if host.netloc == '' or host.scheme == '':
         log.warning(f"Host {get_setting('host')} is invalid. Can't return anything")
@@ -34,17 +47,26 @@ def get_client(p_dialog: xbmcgui.DialogProgressBG = None):
         utils.notify(utils.translation(32601), image=utils.get_icon_path())
         return None
     else:
-        log.debug(f"jackett host: {host}")
-        log.debug(f"jackett api_key: {api_key[0:2]}{'*' * 26}{api_key[-4:]}")
+        log.debug("jackett host: %s", host)
+        log.debug("jackett api_key: %s%s%s", api_key[0:2], '*' * 26, api_key[-4:])
+
+    # the clients are imported once they're needed, they load requests and for asyncio the event loop
+    # 0 "requests (threads)"
+    # 1 "asyncio"
+    if get_setting('http_engine', int) == 1:
+        from async_client import AsyncJackett as client_class
+    else:
+        from client import Jackett as client_class
 
-    return Jackett(host=host.geturl(), api_key=api_key, p_dialog=p_dialog)
+    return client_class(host=host.geturl(), api_key=api_key, p_dialog=p_dialog, use_cached_caps=use_cached_caps,
+                        deadline=deadline, stats=stats)
 
 
 def validate_client():
     p_dialog = xbmcgui.DialogProgressBG()
     try:
         p_dialog.create('Elementum [COLOR FFFF6B00]Jackett[/COLOR]', utils.translation(32005))
-        get_client()
+        get_client(use_cached_caps=False)
         if get_setting("settings_validated") == "Success":
             utils.notify(utils.translation(32006), image=utils.get_icon_path())
         addon.ADDON.openSettings()
@@ -54,26 +76,37 @@ def validate_client():
 
 
 def search(payload, method="general"):
+    try:
+        return search_or_raise(payload, method)
+    except Exception as exc:
+        utils.notify(utils.translation(32703))
+        log.error(f"Got exeption: {traceback.format_exc()}")
+        return []
+
+
+def search_or_raise(payload, method="general"):
+    """Same as search, but raises what went wrong instead of notifying about it"""
     payload = parse_payload(method, payload)
 
-    log.debug(f"Searching with payload ({method}): f{payload}")
+    log.debug("Searching with payload (%s): %s", method, Payload(payload))
 
     p_dialog = xbmcgui.DialogProgressBG()
     p_dialog.create('Elementum [COLOR FFFF6B00]Jackett[/COLOR]', utils.translation(32602))
-    results = []
 
     try:
         request_start_time = time.time()
-        results = search_jackett(p_dialog, payload, method)
+        deadline = utils.Deadline(get_setting('search_deadline', int))
+        stats = Stats(method)
+        # display fields are only formatted for the results that are returned
+        results = [result.to_elementum() for result in search_jackett(p_dialog, payload, method, deadline, stats)]
         request_end_time = time.time()
         request_time = round(request_end_time - request_start_time, 2)
 
-        log.debug(f"All results: {results}")
+        log.debug("All results: %s", Payload(results))
 
         log.info(f"Jackett returned {len(results)} results in {request_time} seconds")
-    except Exception as exc:
-        utils.notify(utils.translation(32703))
-        log.error(f"Got exeption: {traceback.format_exc()}")
+        log.info(f"search took {stats.summary(deadline)}")
+        stats.write()
     finally:
         p_dialog.close()
         del p_dialog
@@ -114,96 +147,204 @@ def parse_payload(method, payload):
     return payload
 
 
-def filter_results(method, results):
-    log.debug(f"results before filtered: {results}")
-
-    if get_setting('filter_keywords_enabled', bool):
-        log.info(f"filtering keywords {len(results)}")
-        results = filter.keywords(results)
-        log.debug(f"filtering keywords results: {results}")
+def filter_results(method, results, stats=None):
+    log.debug("results before filtered: %s", Payload(results))
 
-    if get_setting('filter_size_enabled', bool):
-        log.info(f"filtering size {len(results)}")
-        results = filter.size(method, results)
-        log.debug(f"filtering size results: {results}")
-
-    if get_setting('filter_include_resolution_enabled', bool):
-        log.info(f"filtering resolution {len(results)}")
-        results = filter.resolution(results)
-        log.debug(f"filtering resolution results: {results}")
-
-    if get_setting('filter_include_release', bool):
-        log.info(f"filtering release type {len(results)}")
-        results = filter.release_type(results)
-        log.debug(f"filtering release type results: {results}")
-
-    if get_setting('filter_exclude_no_seed', bool):
-        log.info(f"filtering no seeds {len(results)}")
-        results = filter.seed(results)
-        log.debug(f"filtering no seeds results: {results}")
+    plan = filter.Plan(method)
+    log.info(f"filtering {len(results)} results on {plan}")
+    results = plan.apply(results, stats)
 
     # todo maybe rating and codec
 
-    log.debug(f"Results resulted in {len(results)} results: {results}")
+    log.debug("Results resulted in %d results: %s", len(results), Payload(results))
 
     return results
 
 
-def sort_results(results):
-    sort_by = get_setting('sort_by', int)
-    # 0 "Resolution"
-    # 1 "Seeds"
-    # 2 "Size"
-    # 3 "Balanced"
+def sort_results(results, method="general"):
+    """Returns a Ranking, the results come out of it best first and are only ordered as far as they're taken"""
+    return ranking.Ranking(results, ranking.sort_key(get_setting('sort_by', int), method))
 
-    if sort_by == 0:
-        sorted_results = sorted(results, key=lambda r: r["resolution"], reverse=True)
-    elif sort_by == 1:
-        sorted_results = sorted(results, key=lambda r: r['seeds'], reverse=True)
-    elif sort_by == 2:
-        sorted_results = sorted(results, key=lambda r: r['size'], reverse=True)
-    else:
-        # todo do something more advanced with the "balanced" option
-        sorted_results = sorted(results, key=lambda r: r["seeds"] * 3 * r["resolution"], reverse=True)
 
-    return sorted_results
+def search_jackett(p_dialog, payload, method, deadline=None, stats=None, use_prefetched=True):
+    if deadline is None:
+        deadline = utils.Deadline(0)
+    if stats is None:
+        stats = Stats(method)
 
+    if use_prefetched:
+        prefetched = prefetch.lookup(method, payload)
+        if prefetched is not None:
+            log.info(f"using {len(prefetched)} prefetched results")
+            stats.count("prefetched", len(prefetched))
+            p_dialog.update(100, message=utils.translation(32754))
+            return prefetched
 
-def search_jackett(p_dialog, payload, method):
-    jackett = get_client(p_dialog)
+    jackett = get_client(p_dialog, deadline=deadline, stats=stats)
     if jackett is None:
         utils.notify(utils.translation(32603), image=utils.get_icon_path())
         return []
 
-    log.debug(f"Processing {method} with Jackett")
+    log.debug("Processing %s with Jackett", method)
     p_dialog.update(message=utils.translation(32604))
+    with stats.stage("search"):
+        requests = _variant_requests(jackett, method, payload)
+        if len(requests) > 1:
+            # all at once, so searching with more titles or season packs too doesn't take longer
+            log.info(f"making {len(requests)} search requests at once")
+            stats.count("search_requests", len(requests))
+        res = jackett.search_requests(requests)
+
+    log.debug("%s search returned %d results", method, len(res))
+    stats.count("results", len(res))
+    with stats.stage("unique"):
+        unique = filter.unique(res)
+    log.info(f"merged {len(res) - len(unique)} duplicate results, {len(unique)} unique results left")
+    stats.count("merged", len(res) - len(unique))
+    res = unique
+
+    p_dialog.update(25, message=utils.translation(32750))
+    with stats.stage("filter"):
+        res = filter_results(method, res, stats)
+    stats.count("filtered", len(res))
+
+    p_dialog.update(message=utils.translation(32753))
+    with stats.stage("sort"):
+        res = sort_results(res, method)
+
+    with stats.stage("resolve"):
+        res = resolve_results(jackett, res, get_setting('max_results', int), deadline, stats)
+
+    p_dialog.update(100, message=utils.translation(32754))
+    return res
+
+
+def title_variants(method, payload):
+    """
+    The titles to search with. That's the search title, and when searching with several titles is enabled, the
+    original, Kodi language and English titles as well, as far as they're different.
+    """
+    titles = [payload["search_title"]]
+    if method == 'general' or not get_setting('title_variants_enabled', bool):
+        return titles
+
+    candidates = []
+    if get_setting('title_variant_original', bool):
+        candidates.append(payload['titles'].get('original') or payload['titles'].get('source') or payload['title'])
+    if get_setting('title_variant_kodi_language', bool):
+        candidates.append(payload['titles'].get(xbmc.getLanguage(xbmc.ISO_639_1)))
+    if get_setting('title_variant_english', bool):
+        candidates.append(payload['titles'].get('en'))
+
+    seen = {_normalize_title(titles[0])}
+    for title in candidates:
+        if title and _normalize_title(title) not in seen and len(titles) < _max_title_variants:
+            seen.add(_normalize_title(title))
+            titles.append(title)
+
+    log.debug("title variants: %s", titles)
+    return titles
+
+
+def _normalize_title(title):
+    return " ".join(title.lower().split())
+
+
+def _variant_requests(jackett, method, payload):
+    """
+    The search requests for the search title and its variants. Variants only make a difference to searches by title,
+    a search by IMDb id is made as it is. Requests that come out the same for several titles are made once.
+    """
+    titles = title_variants(method, payload)
+    requests = _search_requests(jackett, method, payload, titles[0])
+    if not any("q" in params for params, _ in requests):
+        return requests
+
+    for title in titles[1:]:
+        requests += _search_requests(jackett, method, payload, title)
+    # show searches have no year in their query to begin with
+    if method == 'movie' and get_setting('title_variants_enabled', bool) and get_setting('title_variant_no_year', bool):
+        for title in titles:
+            requests += jackett.query_requests(title)
+
+    unique = {}
+    for params, season in requests:
+        key = tuple(sorted((k, _normalize_title(str(v))) for k, v in params.items())), season
+        unique.setdefault(key, (params, season))
+    if len(unique) < len(requests):
+        log.debug("%d of the search requests are the same as others", len(requests) - len(unique))
+    return list(unique.values())
+
+
+def _search_requests(jackett, method, payload, title):
+    """The search requests to make for ``title``"""
     if method == 'movie':
-        res = jackett.search_movie(payload["search_title"], payload['year'], payload["imdb_id"])
-    elif method == 'season':
-        res = jackett.search_season(payload["search_title"], payload["season"], payload["imdb_id"])
-    elif method == 'episode':
-        res = jackett.search_episode(payload["search_title"], payload["season"], payload["episode"], payload["imdb_id"])
-    elif method == 'anime':
+        return jackett.movie_requests(title, payload['year'], payload["imdb_id"])
+    if method == 'season':
+        return jackett.show_requests(title, season=payload["season"], imdb_id=payload["imdb_id"])
+    if method == 'episode':
+        return jackett.show_requests(title, season=payload["season"], episode=payload["episode"],
+                                     imdb_id=payload["imdb_id"])
+    if method == 'anime':
         log.warning("jackett provider does not yet support anime search")
-        res = []
         log.info(f"anime payload={payload}")
-    #     client.search_query(payload["search_title"], payload["season"], payload["episode"], payload["imdb_id"])
-    else:
-        res = jackett.search_query(payload["search_title"])
+        #     client.search_query(payload["search_title"], payload["season"], payload["episode"], payload["imdb_id"])
+        return []
 
-    log.debug(f"{method} search returned {len(res)} results")
-    p_dialog.update(25, message=utils.translation(32750))
-    res = filter_results(method, res)
+    return jackett.query_requests(title)
+
+
+def resolve_results(jackett, ranked: ranking.Ranking, max_results, deadline=None, stats=None):
+    """
+    Resolves magnets for the best ranked results only. A few extra results are resolved to make up for failures and
+    duplicates, and if the results still come up short the next ones in the ranking are resolved. Once the deadline
+    passes, the best ranked results it left no time to resolve fill up the slots that are left as they are. Of the
+    results that failed to resolve, which Elementum can't resolve either, no more than ``_unresolved_max`` do.
+    """
+    results, failed, unresolved, seen = [], [], [], set()
+    total = len(ranked)
+    position = duplicates = 0
+    while len(results) < max_results and len(ranked):
+        if deadline is not None and deadline.expired():
+            log.warning(f"deadline passed, returning {len(results)} resolved results and unresolved ones")
+            unresolved += ranked.take(max_results - len(results))
+            break
+
+        missing = max_results - len(results)
+        batch = ranked.take(missing + max(_resolve_margin_min, int(missing * _resolve_margin)))
+        position += len(batch)
+
+        batch_failed = []
+        for res in jackett.async_magnet_resolve(batch):
+            if not res.info_hash:
+                batch_failed.append(res)
+                continue
+
+            info_hash = res.info_hash.lower()
+            if info_hash in seen:
+                duplicates += 1
+                continue
+            seen.add(info_hash)
+            results.append(res)
+        # the deadline may have stopped these before they were resolved
+        if deadline is not None and deadline.expired():
+            unresolved += batch_failed
+        else:
+            failed += batch_failed
 
-    res = jackett.async_magnet_resolve(res)
+    log.info(f"resolved {position} of {total} results for {len(results)} unique results, {len(failed)} failed")
+    if stats is not None:
+        stats.count("duplicates", duplicates)
 
-    p_dialog.update(90, message=utils.translation(32752))
-    res = filter.unique(res)
-    log.info(f"filtering for unique items {len(res)}")
-    log.debug(f"unique items results: {res}")
+    results = results[:max_results]
+    results += _unique_uris(unresolved)[:max_results - len(results)]
+    return results + _unique_uris(failed)[:min(_unresolved_max, max_results - len(results))]
 
-    p_dialog.update(95, message=utils.translation(32753))
-    res = sort_results(res)
 
-    p_dialog.update(100, message=utils.translation(32754))
-    return res[:get_setting('max_results', int)]
+def _unique_uris(results):
+    """The results with a link, the first one of each link only"""
+    unique = {}
+    for res in results:
+        if res.uri:
+            unique.setdefault(res.uri, res)
+    return list(unique.values())
@@ -1,9 +1,14 @@
 import logging
+import reprlib
 
 from kodi_six import xbmc
 
 import addon
 
+# payloads dumped to the debug log are cut off after this many characters / items
+DUMP_MAX_CHARS = 2000
+DUMP_MAX_ITEMS = 10
+
 
 class XBMCHandler(logging.StreamHandler):
     xbmc_levels = {
@@ -19,7 +24,48 @@ def emit(self, record):
         xbmc.log(self.format(record), xbmc_level)
 
 
+class Payload(object):
+    """
+    A log argument for payloads: only formatted when the record is actually emitted, and then truncated to the first
+    ``max_items`` items of a list and ``max_chars`` characters. Use it with %-style logging:
+    ``log.debug("results: %s", Payload(results))``.
+    """
+
+    __slots__ = ("value", "max_items", "max_chars")
+
+    def __init__(self, value, max_items=DUMP_MAX_ITEMS, max_chars=DUMP_MAX_CHARS):
+        self.value = value
+        self.max_items = max_items
+        self.max_chars = max_chars
+
+    def __str__(self):
+        value = self.value
+        more = ""
+        if isinstance(value, (list, tuple)) and len(value) > self.max_items:
+            more = f" ... and {len(value) - self.max_items} more"
+            value = value[:self.max_items]
+
+        text = value.decode("utf-8", "replace") if isinstance(value, (bytes, bytearray)) else str(value)
+        if len(text) > self.max_chars:
+            more = f" ... {len(text) - self.max_chars} more characters" + more
+            text = text[:self.max_chars]
+        return text + more
+
+    def __repr__(self):
+        return reprlib.repr(self.value)
+
+
+def kodi_debug_enabled():
+    """Whether debug logging is enabled in Kodi's settings, anything below INFO is dropped otherwise"""
+    try:
+        return bool(xbmc.getCondVisibility("System.GetBool(debug.showloginfo)"))
+    except Exception:
+        return False
+
+
 log = logging.getLogger(addon.ID)
+# filter records before they're formatted, Kodi would drop the debug ones anyway
+log.setLevel(logging.DEBUG if kodi_debug_enabled() else logging.INFO)
 
 handler = XBMCHandler()
 handler.setFormatter(logging.Formatter('[%(name)s] %(message)s'))
@@ -11,9 +11,7 @@
 sys.path.insert(0, path.dirname(__file__))
 
 if __name__ == '__main__':
-    import debugger
     import utils
-    import jackett
 
     if len(sys.argv) == 1:
         log.error("Elementum Jackett plugin must be run through Elementum")
@@ -26,12 +24,16 @@
         sys.exit(1)
 
     if sys.argv[1] == "validate_settings":
+        import jackett
         jackett.validate_client()
     else:
+        import daemon
+        import debugger
         debugger.load()
+        # searches run in the background service when it's there, in this process otherwise
         register(
-            lambda q: jackett.search(q),
-            lambda q: jackett.search(q, 'movie'),
-            lambda q: jackett.search(q, 'episode'),
-            lambda q: jackett.search(q, 'season'),
+            lambda q: daemon.search(q),
+            lambda q: daemon.search(q, 'movie'),
+            lambda q: daemon.search(q, 'episode'),
+            lambda q: daemon.search(q, 'season'),
         )
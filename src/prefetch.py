@@ -0,0 +1,67 @@
+# coding=utf-8
+"""
+Results of searches the background service ran ahead of time, see ``service``. A search checks here first, so the
+next episode of a show that's being watched comes back without waiting on Jackett.
+"""
+import re
+
+from cache import Cache
+from result import Result
+from utils import get_setting
+
+# only show searches are predictable enough to be worth running ahead
+METHODS = ("episode", "season")
+
+_cache = None
+
+
+def enabled():
+    return get_setting('prefetch_enabled', bool)
+
+
+def _prefetched():
+    global _cache
+    if _cache is None:
+        _cache = Cache("prefetched", ttl=get_setting('prefetch_ttl', int) * 60, max_entries=200)
+    return _cache
+
+
+def cache_keys(method, payload):
+    """
+    The keys a search is stored under: one by IMDb id and one by title, since what Elementum sends for a show doesn't
+    always match what the library has.
+    """
+    if method not in METHODS:
+        return []
+
+    numbers = f"{payload['season']}" if method == "season" else f"{payload['season']}x{payload['episode']}"
+    keys = []
+    if payload.get("imdb_id"):
+        keys.append(f"{method}:imdb:{payload['imdb_id']}:{numbers}")
+    title = re.sub(r'\W+', ' ', payload.get("title", "")).strip().lower()
+    if title:
+        keys.append(f"{method}:title:{title}:{numbers}")
+    return keys
+
+
+def lookup(method, payload):
+    """The prefetched results of a search, best first, or None"""
+    keys = cache_keys(method, payload)
+    if not keys or not enabled():
+        return None
+
+    found = _prefetched().get_many(keys)
+    for key in keys:
+        if key in found:
+            return [Result.from_row(row) for row in found[key]]
+    return None
+
+
+def is_prefetched(method, payload):
+    keys = cache_keys(method, payload)
+    return bool(keys) and bool(_prefetched().get_many(keys))
+
+
+def store(method, payload, results):
+    rows = [result.to_row() for result in results]
+    _prefetched().set_many({key: rows for key in cache_keys(method, payload)})
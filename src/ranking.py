@@ -0,0 +1,156 @@
+# coding=utf-8
+"""
+Result ranking. Sort keys are computed once per result and the results are pulled off a heap in order, so only the
+results that are actually used get ordered.
+"""
+import heapq
+import math
+
+from classifier import UNKNOWN, resolution_classifier
+from utils import get_setting
+
+# 0 "Resolution"
+# 1 "Seeds"
+# 2 "Size"
+# 3 "Balanced"
+SORT_RESOLUTION, SORT_SEEDS, SORT_SIZE, SORT_BALANCED = range(4)
+
+# weights of the parts of the balanced score, each part is between 0 and 1
+BALANCED_WEIGHTS = {
+    "seeds": 0.35,
+    "resolution": 0.25,
+    "release_type": 0.15,
+    "size": 0.15,
+    "peers": 0.10,
+}
+# seeds and peers count logarithmically, this many count as much as it gets
+_SEEDS_SATURATION = 1000
+_PEERS_SATURATION = 1000
+
+# how watchable each release type is
+RELEASE_TYPE_QUALITY = {
+    'brrip': 1.0,
+    'webdl': 0.9,
+    'hdrip': 0.75,
+    'h26x': 0.7,
+    'hdtv': 0.65,
+    'dvd': 0.55,
+    '3d': 0.5,
+    'tvrip': 0.45,
+    'iptvrip': 0.45,
+    UNKNOWN: 0.4,
+    'dvdscr': 0.3,
+    'screener': 0.3,
+    'vhsrip': 0.2,
+    'telesync': 0.1,
+    'line': 0.1,
+    'cam': 0.05,
+    'workprint': 0.05,
+    'trailer': 0.0,
+}
+_GB = 1024 * 1024 * 1024
+
+
+class Ranking(object):
+    """
+    Iterates over results from best to worst, by a ``key`` that sorts the best results first (like ``sorted`` does
+    without ``reverse``). Building it is O(n), every result taken from it O(log n), so taking the best k costs
+    O(n + k log n) instead of sorting everything. Ties keep the order the results came in.
+    """
+
+    def __init__(self, results, key):
+        self._heap = [(key(result), i, result) for i, result in enumerate(results)]
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._heap:
+            raise StopIteration
+        return heapq.heappop(self._heap)[2]
+
+    def take(self, n):
+        """Removes and returns the next ``n`` best results"""
+        return [heapq.heappop(self._heap)[2] for _ in range(min(n, len(self._heap)))]
+
+
+def sort_key(sort_by, method="general"):
+    """
+    A function mapping a result to a tuple that sorts the best results first, ties on the first value are broken by
+    the next ones. Values are negated since higher is better for all of them.
+    """
+    ranks = resolution_classifier.ranks
+    if sort_by == SORT_RESOLUTION:
+        return lambda r: (-ranks[r.resolution], -r.seeds, -r.peers)
+    if sort_by == SORT_SEEDS:
+        return lambda r: (-r.seeds, -r.peers, -ranks[r.resolution])
+    if sort_by == SORT_SIZE:
+        return lambda r: (-r.size, -r.seeds)
+
+    score = balanced_score(method)
+    return lambda r: (-score(r), -r.seeds)
+
+
+def balanced_score(method="general"):
+    """
+    Scores a result between 0 and 1 on a weighted mix of seeds, peers, resolution, release type and how well its size
+    fits the size range configured for ``method``: fully inside the range, less the further outside it the size is.
+    """
+    # everything that doesn't depend on the result is worked out up front, this runs for every result
+    seeds_scores = _log_scores(BALANCED_WEIGHTS["seeds"], _SEEDS_SATURATION)
+    peers_scores = _log_scores(BALANCED_WEIGHTS["peers"], _PEERS_SATURATION)
+    max_seeds, max_peers = BALANCED_WEIGHTS["seeds"], BALANCED_WEIGHTS["peers"]
+    max_rank = max(resolution_classifier.ranks.values())
+    resolution_scores = {
+        resolution: BALANCED_WEIGHTS["resolution"] * rank / max_rank
+        for resolution, rank in resolution_classifier.ranks.items()
+    }
+    release_type_scores = {
+        release_type: BALANCED_WEIGHTS["release_type"] * quality
+        for release_type, quality in RELEASE_TYPE_QUALITY.items()
+    }
+    unknown_release_type = release_type_scores[UNKNOWN]
+    w_size = BALANCED_WEIGHTS["size"]
+    unknown_size = w_size * 0.5
+    min_size, max_size = _size_range(method)
+
+    def score(result):
+        seeds, peers, size = result.seeds, result.peers, result.size
+        if size < 0:
+            size_score = unknown_size
+        elif size < min_size:
+            size_score = w_size * size / min_size
+        elif size > max_size > 0:
+            size_score = w_size * max_size / size
+        else:
+            size_score = w_size
+
+        return (seeds_scores[seeds] if 0 <= seeds < _SEEDS_SATURATION else max_seeds if seeds > 0 else 0.0) \
+            + (peers_scores[peers] if 0 <= peers < _PEERS_SATURATION else max_peers if peers > 0 else 0.0) \
+            + resolution_scores[result.resolution] \
+            + release_type_scores.get(result.release_type, unknown_release_type) \
+            + size_score
+
+    return score
+
+
+def _log_scores(weight, saturation):
+    """``weight`` scaled by log(1 + n) / log(1 + saturation) for every n below ``saturation``"""
+    scale = weight / math.log1p(saturation)
+    return [scale * math.log1p(n) for n in range(saturation)]
+
+
+def _size_range(method):
+    """The size range in bytes the size filter uses for ``method``"""
+    if method in ["movie", "season", "episode"]:
+        min_size = get_setting('size_' + method + '_min', float)
+        max_size = get_setting('size_' + method + '_max', float)
+    else:
+        min_size = get_setting('size_min', float)
+        max_size = get_setting('size_max', float)
+
+    return min_size * _GB, max_size * _GB
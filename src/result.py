@@ -0,0 +1,74 @@
+# coding=utf-8
+"""
+The record a torznab item is parsed into, and how it's handed over to Elementum
+"""
+import sys
+
+from classifier import UNKNOWN
+from utils import get_provider_color, get_provider_icon, get_resolution_rank, human_size
+
+
+class Result(object):
+    """
+    A search result. Only what filtering, ranking and resolving need is kept, ``size`` in bytes (-1 when unknown) and
+    ``resolution`` as its label. ``provider`` is the indexer the result came from, ``providers`` every indexer that
+    found it once duplicates are merged, empty as long as that's only ``provider``. What Elementum displays is formatted
+    by ``to_elementum``, for the results that make the cut only.
+    """
+
+    __slots__ = ("name", "provider", "uri", "info_hash", "seeds", "peers", "size", "resolution", "release_type",
+                 "guid", "providers")
+
+    def __init__(self, name, provider, uri, info_hash="", seeds=0, peers=0, size=-1, resolution=UNKNOWN,
+                 release_type=UNKNOWN, guid=None, providers=""):
+        self.name = name
+        # thousands of results share a handful of indexer names
+        self.provider = sys.intern(provider)
+        self.uri = uri
+        self.info_hash = info_hash
+        self.seeds = seeds
+        self.peers = peers
+        self.size = size
+        self.resolution = resolution
+        self.release_type = release_type
+        self.guid = guid
+        self.providers = providers
+
+    @property
+    def resolution_rank(self):
+        return get_resolution_rank(self.resolution)
+
+    @property
+    def display_size(self):
+        return human_size(self.size) if self.size >= 0 else "Unknown"
+
+    @property
+    def display_provider(self):
+        return ", ".join(f'[COLOR {get_provider_color(provider)}]{provider}[/COLOR]'
+                         for provider in (self.providers.split(", ") if self.providers else [self.provider]))
+
+    def to_elementum(self):
+        return {
+            "name": self.name,
+            "provider": self.display_provider,
+            "size": self.display_size,
+            "uri": self.uri,
+            "seeds": self.seeds,
+            "peers": self.peers,
+            "info_hash": self.info_hash,
+            "language": None,
+            "icon": get_provider_icon(self.provider),
+            "resolution": self.resolution_rank,
+            "release_type": self.release_type,
+        }
+
+    def to_row(self):
+        """A JSON friendly list of the fields, in the order ``from_row`` takes them"""
+        return [getattr(self, field) for field in self.__slots__]
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row)
+
+    def __repr__(self):
+        return f"Result({', '.join(f'{field}={getattr(self, field)!r}' for field in self.__slots__)})"
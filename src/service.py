@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+Background service. It hosts the ``daemon`` that runs the provider's searches, and searches ahead for what's likely to
+be played next: the next episode, and its season, of a show that starts playing, and the next episode of the shows in
+progress in the library. Searches ahead only run while Kodi has been idle for a while and are rate limited, the
+results go to ``prefetch`` where ``search_jackett`` finds them.
+"""
+import heapq
+import json
+import sys
+import threading
+import time
+from collections import deque
+from os import path
+
+from kodi_six import xbmc
+
+import daemon
+import prefetch
+from logger import log
+from stats import Stats
+from utils import Deadline, get_setting
+
+# Kodi runs the service like it runs main.py, the searches it runs need the bundled libraries too
+sys.path.insert(0, path.realpath(path.join(path.dirname(__file__), '..', 'resources', 'libs')))
+sys.path.insert(0, path.dirname(__file__))
+
+# jobs with a lower priority run first
+PRIORITY_EPISODE, PRIORITY_SEASON, PRIORITY_IN_PROGRESS = range(3)
+
+# how often the service wakes up to look for work, and looks at the shows in progress
+_tick = 5
+_in_progress_interval = 6 * 60 * 60
+_in_progress_max_shows = 10
+
+
+class RateLimit(object):
+    """
+    At least ``prefetch_interval`` seconds between searches, and no more than ``prefetch_per_hour`` of them an hour
+    """
+
+    def __init__(self):
+        self._started = deque()
+
+    def ready(self, now=None):
+        now = time.monotonic() if now is None else now
+        while self._started and now - self._started[0] > 3600:
+            self._started.popleft()
+
+        if len(self._started) >= get_setting('prefetch_per_hour', int):
+            return False
+        return not self._started or now - self._started[-1] >= get_setting('prefetch_interval', int)
+
+    def record(self, now=None):
+        self._started.append(time.monotonic() if now is None else now)
+
+
+class _SilentDialog(object):
+    """Stands in for the progress dialog, background searches don't show one"""
+
+    def update(self, *args, **kwargs):
+        pass
+
+
+class Prefetcher(object):
+    """
+    A queue of searches, run one at a time whenever Kodi is idle and the rate limit allows. They run on a thread of
+    their own so the service keeps answering Kodi meanwhile.
+    """
+
+    def __init__(self, monitor):
+        self._monitor = monitor
+        self._queue = []
+        self._queued = set()
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self.rate_limit = RateLimit()
+
+    def schedule(self, method, payload, priority):
+        keys = tuple(prefetch.cache_keys(method, payload))
+        if not keys:
+            return
+
+        with self._lock:
+            if keys in self._queued:
+                return
+            self._queued.add(keys)
+            self._seq += 1
+            heapq.heappush(self._queue, (priority, self._seq, method, payload, keys))
+        log.debug("prefetch: scheduled %s search for %s", method, keys[0])
+
+    def schedule_episode(self, title, imdb_id, season, episode, priority=PRIORITY_EPISODE):
+        payload = {"title": title, "imdb_id": imdb_id, "season": season, "episode": episode}
+        self.schedule("episode", payload, priority)
+        if priority == PRIORITY_EPISODE:
+            # whoever watches this episode will likely want the rest of the season too
+            self.schedule("season", {"title": title, "imdb_id": imdb_id, "season": season}, PRIORITY_SEASON)
+
+    def schedule_next(self, episode):
+        """Schedules the searches for the episode after ``episode``, which is a JSON-RPC episode item"""
+        upcoming = _next_episode(episode)
+        if upcoming is not None:
+            self.schedule_episode(episode["showtitle"], _show_imdb_id(episode["tvshowid"]), *upcoming)
+
+    def schedule_in_progress(self):
+        """Schedules a search for the next unwatched episode of each of the shows in progress"""
+        shows = _rpc("VideoLibrary.GetInProgressTVShows", properties=["title"],
+                     limits={"end": _in_progress_max_shows}).get("tvshows", [])
+        for show in shows:
+            episodes = _rpc("VideoLibrary.GetEpisodes", tvshowid=show["tvshowid"], properties=["season", "episode"],
+                            filter={"field": "playcount", "operator": "is", "value": "0"},
+                            sort={"method": "episode"}, limits={"end": 1}).get("episodes", [])
+            if episodes:
+                self.schedule_episode(show["title"], _show_imdb_id(show["tvshowid"]), episodes[0]["season"],
+                                      episodes[0]["episode"], PRIORITY_IN_PROGRESS)
+
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def run_pending(self):
+        """Starts the next search if there's one, none is running and now is a good time, returns whether it did"""
+        if self._monitor.abortRequested() or self.running() or not self._queue or not _idle() or \
+                not self.rate_limit.ready():
+            return False
+
+        with self._lock:
+            _, _, method, payload, keys = heapq.heappop(self._queue)
+            self._queued.discard(keys)
+
+        if prefetch.is_prefetched(method, payload):
+            return False
+
+        self.rate_limit.record()
+        # a daemon thread, so a search that's still running doesn't hold up Kodi when it exits
+        self._thread = threading.Thread(target=self._search, args=(method, payload), name="prefetch", daemon=True)
+        self._thread.start()
+        return True
+
+    def _search(self, method, payload):
+        # the service idles most of the time, what a search needs is loaded once it runs one
+        import jackett
+
+        payload = jackett.parse_payload(method, dict(payload, titles={"source": payload["title"]}))
+        stats = Stats(method)
+        stats.count("prefetch")
+        deadline = Deadline(get_setting('search_deadline', int))
+        try:
+            results = jackett.search_jackett(_SilentDialog(), payload, method, deadline, stats, use_prefetched=False)
+        except Exception as e:
+            log.warning(f"prefetch: {method} search for {payload['search_title']} failed: {e}")
+            return
+
+        prefetch.store(method, payload, results)
+        log.info(f"prefetch: stored {len(results)} results of {method} search for {payload['search_title']}, "
+                 f"{stats.summary(deadline)}")
+        stats.write()
+
+
+class PlaybackMonitor(xbmc.Player):
+    """Schedules the next episode's searches when an episode starts playing"""
+
+    def __init__(self, prefetcher):
+        super(PlaybackMonitor, self).__init__()
+        self.prefetcher = prefetcher
+
+    def onAVStarted(self):
+        if not prefetch.enabled():
+            return
+        try:
+            episode = _playing_episode()
+            if episode is not None:
+                self.prefetcher.schedule_next(episode)
+        except Exception as e:
+            log.warning(f"prefetch: unable to look up what's playing: {e}")
+
+
+def _rpc(method, **params):
+    response = json.loads(xbmc.executeJSONRPC(json.dumps({"jsonrpc": "2.0", "id": 1, "method": method,
+                                                          "params": params})))
+    if "error" in response:
+        log.debug("prefetch: %s failed: %s", method, response["error"])
+    return response.get("result") or {}
+
+
+def _playing_episode():
+    """The episode that's playing, with its show's title, or None if it's not an episode"""
+    for player in _rpc("Player.GetActivePlayers") or []:
+        if player.get("type") != "video":
+            continue
+        item = _rpc("Player.GetItem", playerid=player["playerid"],
+                    properties=["showtitle", "season", "episode", "tvshowid"]).get("item", {})
+        if item.get("type") == "episode" and item.get("showtitle") and item.get("season", -1) >= 0:
+            item.setdefault("tvshowid", -1)
+            return item
+    return None
+
+
+def _next_episode(episode):
+    """``(season, episode)`` of the one after ``episode``, from the library if the show is in it"""
+    season, number = episode["season"], episode["episode"]
+    if episode["tvshowid"] < 0:
+        return season, number + 1
+
+    episodes = _rpc("VideoLibrary.GetEpisodes", tvshowid=episode["tvshowid"], properties=["season", "episode"],
+                    sort={"method": "episode"}).get("episodes", [])
+    for upcoming in episodes:
+        if (upcoming["season"], upcoming["episode"]) > (season, number) and upcoming["season"] > 0:
+            return upcoming["season"], upcoming["episode"]
+    return None
+
+
+def _show_imdb_id(tvshowid):
+    if tvshowid is None or tvshowid < 0:
+        return ""
+
+    show = _rpc("VideoLibrary.GetTVShowDetails", tvshowid=tvshowid, properties=["uniqueid"])
+    return show.get("tvshowdetails", {}).get("uniqueid", {}).get("imdb", "")
+
+
+def _idle():
+    return xbmc.getGlobalIdleTime() >= get_setting('prefetch_idle', int)
+
+
+def run():
+    monitor = xbmc.Monitor()
+    prefetcher = Prefetcher(monitor)
+    player = PlaybackMonitor(prefetcher)
+    server = _sync_daemon(None)
+    log.info("service started")
+
+    last_in_progress = None
+    while not monitor.waitForAbort(_tick):
+        server = _sync_daemon(server)
+        if not prefetch.enabled():
+            continue
+        try:
+            now = time.monotonic()
+            if get_setting('prefetch_in_progress', bool) and \
+                    (last_in_progress is None or now - last_in_progress > _in_progress_interval):
+                last_in_progress = now
+                prefetcher.schedule_in_progress()
+            prefetcher.run_pending()
+        except Exception as e:
+            log.warning(f"prefetch: {e}")
+
+    if server is not None:
+        server.stop()
+    del player
+    log.info("service stopped")
+
+
+def _sync_daemon(server):
+    """Starts or stops the daemon when it's been turned on or off in the settings"""
+    if daemon.enabled() == (server is not None):
+        return server
+
+    if server is not None:
+        server.stop()
+        return None
+
+    try:
+        server = daemon.Server()
+        server.start()
+        return server
+    except OSError as e:
+        log.warning(f"daemon: unable to start: {e}")
+        return None
+
+
+if __name__ == '__main__':
+    run()
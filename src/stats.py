@@ -0,0 +1,140 @@
+# coding=utf-8
+"""
+Per search timing and counters, written as one JSON record per search to a rotating file in the addon profile
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import addon
+from logger import log
+
+_STATS_FILE = "stats.jsonl"
+_STATS_FILE_MAX_BYTES = 1024 * 1024
+_STATS_FILE_BACKUPS = 2
+
+_stats_log = None
+_stats_log_lock = threading.Lock()
+
+
+def _get_stats_log():
+    global _stats_log
+    with _stats_log_lock:
+        if _stats_log is None:
+            # logging.handlers is only needed once a search is done
+            from logging.handlers import RotatingFileHandler
+
+            os.makedirs(addon.PROFILE, exist_ok=True)
+            handler = RotatingFileHandler(os.path.join(addon.PROFILE, _STATS_FILE), maxBytes=_STATS_FILE_MAX_BYTES,
+                                          backupCount=_STATS_FILE_BACKUPS, encoding="utf-8")
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            _stats_log = logging.getLogger(addon.ID + ".stats")
+            _stats_log.setLevel(logging.INFO)
+            _stats_log.propagate = False
+            _stats_log.addHandler(handler)
+
+        return _stats_log
+
+
+def _percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class Stats(object):
+    """
+    Collects how long each stage of a search took, counters and value distributions. Safe to use from several
+    threads; time spent in a stage by concurrent threads is summed up.
+    """
+
+    def __init__(self, method=None):
+        self.method = method
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._stages = OrderedDict()
+        self._counters = OrderedDict()
+        self._samples = OrderedDict()
+
+    @contextmanager
+    def stage(self, name):
+        # stages are reported in the order they started, not the order they finished in
+        with self._lock:
+            self._stages.setdefault(name, 0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self._stages[name] = self._stages.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def observe(self, name, value):
+        with self._lock:
+            self._samples.setdefault(name, []).append(value)
+
+    def time_of(self, name):
+        return self._stages.get(name, 0.0)
+
+    def record(self):
+        with self._lock:
+            stages = OrderedDict((name, round(seconds * 1000, 3)) for name, seconds in self._stages.items())
+            # the network wait of a stream happens while its items are being parsed
+            if "parse" in stages and "download" in stages:
+                stages["parse"] = round(max(0.0, stages["parse"] - stages["download"]), 3)
+
+            distributions = OrderedDict()
+            for name, values in self._samples.items():
+                ordered = sorted(values)
+                distributions[name] = {
+                    "count": len(ordered),
+                    "p50": round(_percentile(ordered, 50) * 1000, 1),
+                    "p90": round(_percentile(ordered, 90) * 1000, 1),
+                    "p99": round(_percentile(ordered, 99) * 1000, 1),
+                    "max": round(ordered[-1] * 1000, 1),
+                }
+
+            return OrderedDict([
+                ("time", round(self.started, 3)),
+                ("method", self.method),
+                ("total_ms", round((time.time() - self.started) * 1000, 1)),
+                ("stages_ms", stages),
+                ("counters", OrderedDict(self._counters)),
+                ("distributions_ms", distributions),
+            ])
+
+    def summary(self, deadline=None):
+        record = self.record()
+        budget = deadline.budget if deadline is not None else None
+        stages = []
+        for name, ms in record["stages_ms"].items():
+            if budget:
+                stages.append(f"{name} {ms / 1000:.2f}s ({ms / 1000 / budget:.0%})")
+            else:
+                stages.append(f"{name} {ms / 1000:.2f}s")
+
+        msg = f"{record['total_ms'] / 1000:.2f}s"
+        if budget:
+            msg += f" of {budget:.0f}s budget"
+        msg += ": " + ", ".join(stages)
+
+        if record["counters"]:
+            msg += "; " + ", ".join(f"{name}={n}" for name, n in record["counters"].items())
+        for name, dist in record["distributions_ms"].items():
+            msg += f"; {name} p50={dist['p50']}ms p90={dist['p90']}ms max={dist['max']}ms (n={dist['count']})"
+
+        return msg
+
+    def write(self):
+        try:
+            _get_stats_log().info(json.dumps(self.record(), separators=(',', ':')))
+        except (OSError, ValueError) as e:
+            log.warning(f"Unable to write search stats: {e}")
@@ -1,49 +1,179 @@
 import base64
-import io
+import concurrent.futures
+import logging
+import re
+import threading
 from http import client as httplib
+from urllib.parse import urlparse, urljoin
 
 import requests
-from torf import Torrent, Magnet
+from requests.adapters import HTTPAdapter
 
-from logger import log
+import bencode
+from logger import log, Payload
+from utils import get_setting
 
 session = requests.Session()
 session.headers['User-Agent'] = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_9_3) AppleWebKit/537.36 ' \
                                 '(KHTML, like Gecko) Chrome/35.0.1916.47 Safari/537.36'
 
+_btih_re = re.compile(r'[?&]xt=urn:btih:([0-9a-fA-F]{40}|[a-zA-Z2-7]{32})(?=&|$)')
 
-def get_magnet(original_uri):
+# timeout of every request in a redirect chain
+_hop_timeout_max = 10
+# .torrent files are read in chunks of this size, only until their info dict is complete
+_torrent_chunk_size = 64 * 1024
+
+_resolver = None
+_resolver_lock = threading.Lock()
+_host_slots = {}
+_async_host_slots = {}
+
+
+def resolver():
+    """
+    The long-lived pool that resolves magnets. Its size comes from the settings, and the session's connection pool is
+    sized to match so every worker can keep its connection alive between resolves.
+    """
+    global _resolver
+    with _resolver_lock:
+        if _resolver is None:
+            threads = get_setting('resolver_threads', int)
+            adapter = HTTPAdapter(pool_connections=threads, pool_maxsize=threads)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _resolver = concurrent.futures.ThreadPoolExecutor(max_workers=threads, thread_name_prefix="resolver")
+            log.debug("started resolver with %d threads", threads)
+
+        return _resolver
+
+
+def _host_slot(uri):
+    """Limits how many requests are made to a single host at the same time"""
+    host = urlparse(uri).netloc
+    with _resolver_lock:
+        slot = _host_slots.get(host)
+        if slot is None:
+            slot = threading.BoundedSemaphore(get_setting('resolver_host_connections', int))
+            _host_slots[host] = slot
+
+    return slot
+
+
+def _hop_timeout(deadline):
+    if deadline is None:
+        return _hop_timeout_max
+
+    return deadline.remaining(_hop_timeout_max)
+
+
+def get_magnet(original_uri, deadline=None):
     magnet_prefix = 'magnet:'
     uri = original_uri
 
     while True:
         if len(uri) >= len(magnet_prefix) and uri[0:7] == magnet_prefix:
             return uri
+        if deadline is not None and deadline.expired():
+            log.warning(f"Deadline passed while resolving torrent {original_uri}")
+            break
         try:
-            response = session.get(uri, allow_redirects=False, timeout=10)
+            with _host_slot(uri):
+                response = session.get(uri, allow_redirects=False, stream=True, timeout=_hop_timeout(deadline))
+                with response:
+                    if _is_torrent(response, 'Content-Type'):
+                        # the rest of the file isn't needed, the connection is dropped instead of reading it
+                        return bencode.magnet_from_chunks(response.iter_content(_torrent_chunk_size))
+                    # consume the body so the connection goes back to the pool
+                    response.content
         except requests.exceptions.Timeout as e:
             log.warning(f"Timeout while resolving torrent {uri}")
             break
 
         if response.is_redirect:
             uri = response.headers['Location']
-        elif response.status_code == httplib.OK and response.headers.get('Content-Type') == 'application/x-bittorrent':
-            torrent = Torrent.read_stream(io.BytesIO(response.content))
-            return str(torrent.magnet())
         else:
             log.warning(f"Could not get final redirect location for URI {original_uri}. "
                         f"Response was: {response.status_code} {response.reason}")
-            log.debug(f"Response for failed redirect {original_uri} is")
-            log.debug("=" * 50)
-            for (h, k) in list(response.headers.items()):
-                log.debug(f"{h}: {k}")
-            log.debug("")
-            log.debug(base64.standard_b64encode(response.content))
-            log.debug("=" * 50)
+            _log_failed_response(original_uri, response)
             break
 
     return None
 
 
+async def get_magnet_async(original_uri, deadline=None):
+    """Same as get_magnet, but on the asyncio loop so thousands of resolves don't need thousands of threads"""
+    # only the asyncio engine needs these, and asyncio is slow to import
+    import asyncio
+    import aio
+
+    magnet_prefix = 'magnet:'
+    uri = original_uri
+
+    while True:
+        if uri.startswith(magnet_prefix):
+            return uri
+        if deadline is not None and deadline.expired():
+            log.warning(f"Deadline passed while resolving torrent {original_uri}")
+            break
+        try:
+            async with _async_host_slot(uri):
+                response = await aio.fetch(uri, headers={'User-Agent': session.headers['User-Agent']},
+                                           timeout=_hop_timeout(deadline))
+        except asyncio.TimeoutError:
+            log.warning(f"Timeout while resolving torrent {uri}")
+            break
+
+        if response.is_redirect:
+            uri = urljoin(uri, response.headers['location'])
+        elif _is_torrent(response, 'content-type'):
+            return bencode.magnet_from_torrent(response.content)
+        else:
+            log.warning(f"Could not get final redirect location for URI {original_uri}. "
+                        f"Response was: {response.status_code} {response.reason}")
+            _log_failed_response(original_uri, response)
+            break
+
+    return None
+
+
+def _log_failed_response(uri, response):
+    if not log.isEnabledFor(logging.DEBUG):
+        return
+
+    headers = "\n".join(f"{h}: {k}" for h, k in response.headers.items())
+    log.debug("Response for failed redirect %s is\n%s\n%s\n\n%s\n%s", uri, "=" * 50, headers,
+              Payload(base64.standard_b64encode(response.content)), "=" * 50)
+
+
+def _async_host_slot(uri):
+    """Like _host_slot, for coroutines. Only ever called on the loop's thread so it needs no lock"""
+    import asyncio
+
+    host = urlparse(uri).netloc
+    slot = _async_host_slots.get(host)
+    if slot is None:
+        slot = asyncio.Semaphore(get_setting('resolver_host_connections', int))
+        _async_host_slots[host] = slot
+
+    return slot
+
+
+def _is_torrent(response, content_type):
+    return response.status_code == httplib.OK and response.headers.get(content_type) == 'application/x-bittorrent'
+
+
 def get_info_hash(magnet):
-    return Magnet.from_string(magnet).infohash
+    """
+    The info hash of a magnet link as lower case hex, base32 hashes are converted. Parsed with a regex since this runs
+    for every magnet in a search, torf is only used for links the regex doesn't understand.
+    """
+    match = _btih_re.search(magnet)
+    if match is not None:
+        info_hash = match.group(1)
+        if len(info_hash) == 32:
+            return base64.b32decode(info_hash.upper()).hex()
+        return info_hash.lower()
+
+    from torf import Magnet
+    return Magnet.from_string(magnet).infohash.lower()
@@ -1,57 +1,75 @@
 # coding=utf-8
+import functools
 import hashlib
 import os
 import re
-from collections import OrderedDict
+import time
 
 from kodi_six import xbmcgui
 
 import addon
+from classifier import resolution_classifier, release_type_classifier
 from logger import log
 
 _plugin_setting_prefix = "elementum.jackett."
 
 PROVIDER_COLOR_MIN_BRIGHTNESS = 50
+PROVIDER_ICONS_DIR = "icons"
 
-UNKNOWN = 'unknown'
-
-resolutions = OrderedDict([
-    ('4k', [r'4k', r'2160[p]', r'uhd', r'4k', r'hd4k']),
-    ('2k', [r'1440[p]', r'2k']),
-    ('1080p', [r'1080[ip]', r'1920x1080', r'hd1080p?', r'fullhd', r'fhd', r'blu\W*ray', r'bd\W*remux']),
-    ('720p', [r'720[p]', r'1280x720', r'hd720p?', r'hd\-?rip', r'b[rd]rip']),
-    ('480p', [r'480[p]', r'xvid', r'dvd', r'dvdrip', r'hdtv', r'web\-(dl)?rip', r'iptv', r'sat\-?rip',
-              r'tv\-?rip']),
-    ('240p', [r'240[p]', r'vhs\-?rip']),
-    (UNKNOWN, []),
-])
-
-_release_types = OrderedDict([
-    ('brrip', [r'brrip', r'bd\-?rip', r'blu\-?ray', r'bd\-?remux']),
-    ('webdl', [r'web', r'web_?\-?dl', r'web\-?rip', r'dl\-?rip', r'yts']),
-    ('hdrip', [r'hd\-?rip']),
-    ('hdtv', [r'hd\-?tv']),
-    ('dvd', [r'dvd', r'dvd\-?rip', r'vcd\-?rip', r'divx', r'xvid']),
-    ('dvdscr', [r'dvd\-?scr(eener)?']),
-    ('screener', [r'screener', r'scr']),
-    ('3d', [r'3d']),
-    ('telesync', [r'telesync', r'ts', r'tc']),
-    ('cam', [r'cam(\-rip)?', r'hd\-?cam']),
-    ('tvrip', [r'tv\-?rip', r'sat\-?rip', r'dvb']),
-    ('vhsrip', [r'vhs\-?rip']),
-    ('iptvrip', [r'iptv\-?rip']),
-    ('trailer', [r'trailer']),
-    ('workprint', [r'workprint']),
-    ('line', [r'line']),
-    ('h26x', [r'x26[45]']),
-    (UNKNOWN, [])
-])
 
+class Deadline(object):
+    """The time a search has to be finished by"""
 
+    def __init__(self, seconds):
+        self.start = time.monotonic()
+        self.budget = seconds if seconds > 0 else None
+        self.at = self.start + seconds if seconds > 0 else None
+
+    def remaining(self, limit=None):
+        """Seconds left, capped by ``limit``. None when there's neither a deadline nor a limit"""
+        if self.at is None:
+            return limit
+
+        remaining = max(0.0, self.at - time.monotonic())
+        return remaining if limit is None else min(limit, remaining)
+
+    def expired(self):
+        return self.at is not None and time.monotonic() >= self.at
+
+
+@functools.lru_cache(maxsize=None)
 def get_icon_path(icon='icon.png'):
     return os.path.join(addon.PATH, 'resources', 'images', icon)
 
 
+def get_provider_icon(provider_name):
+    """
+    The icon of an indexer, an image in the profile's ``icons`` directory named after the indexer like
+    ``the-pirate-bay.png``, or the addon icon when there's none
+    """
+    return _provider_icons().get(_icon_slug(provider_name)) or get_icon_path()
+
+
+@functools.lru_cache(maxsize=None)
+def _provider_icons():
+    """Indexer icons by slug, the directory is listed once per process"""
+    icons_dir = os.path.join(addon.PROFILE, PROVIDER_ICONS_DIR)
+    try:
+        files = os.listdir(icons_dir)
+    except OSError:
+        return {}
+
+    return {
+        _icon_slug(os.path.splitext(file)[0]): os.path.join(icons_dir, file)
+        for file in files
+        if os.path.splitext(file)[1].lower() in ('.png', '.jpg', '.jpeg')
+    }
+
+
+def _icon_slug(name):
+    return re.sub(r'[^a-z0-9]+', '-', name.lower()).strip('-')
+
+
 def translation(id_value):
     return addon.ADDON.getLocalizedString(id_value)
 
@@ -73,20 +91,23 @@ def human_size(nbytes):
 
 
 def get_resolution(name):
-    return _search_re_keys(name, resolutions, "resolution", UNKNOWN)
+    return _classify(name, resolution_classifier, "resolution")
 
 
 def get_release_type(name):
-    return _search_re_keys(name, _release_types, "release type", UNKNOWN)
+    return _classify(name, release_type_classifier, "release type")
+
+
+def get_resolution_rank(resolution):
+    return resolution_classifier.ranks[resolution]
 
 
-def _search_re_keys(name, re_dict, log_msg, default=""):
-    for result, search_keys in list(re_dict.items()):
-        if bool(re.search(r'\W+(' + "|".join(search_keys) + r')\W*', name, re.IGNORECASE)):
-            return result
+def _classify(name, classifier, log_msg):
+    result = classifier.classify(name)
+    if result == classifier.default:
+        log.warning("Could not determine %s from filename '%s'", log_msg, name)
 
-    log.warning(f"Could not determine {log_msg} from filename '{name}'")
-    return default
+    return result
 
 
 def set_setting(key, value):
@@ -98,6 +119,7 @@ def get_setting(key, converter=str, choices=None):
     return original_get_settings(_plugin_setting_prefix + key, converter, choices)
 
 
+@functools.lru_cache(maxsize=None)
 def get_provider_color(provider_name):
     hash = hashlib.sha256(provider_name.encode("utf")).hexdigest()
     colors = []